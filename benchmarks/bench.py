@@ -0,0 +1,342 @@
+"""
+Benchmarks of mozaik on synthetic decks.
+
+Each case is measured for several sizes (number of slides, table rows or
+distinct pictures). The wall time is the best of a few runs, the peak memory is
+measured by tracemalloc in a separate run. Memory allocated by C extensions
+outside of the Python allocator (like decoded pictures) is not included.
+
+Run the suite and keep the results of a revision:
+
+    python benchmarks/bench.py --output before.json
+
+Compare the results of two revisions:
+
+    python benchmarks/bench.py --compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image
+
+from mozaik import Presentation, Slide
+from mozaik.objects.textbox_with_title import TextboxWithTitle
+from mozaik.slide import _parse_layout
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+# Number of distinct synthetic pictures, cycled over the slides
+MAX_PICTURES = 100
+TEXT = "The quick brown fox jumps over the lazy dog. " * 4
+
+# A case builds its input for a size, and returns the function to measure
+Setup = Callable[[int], Callable[[], None]]
+
+
+class Case:
+    def __init__(self, name: str, setup: Setup, description: str):
+        self.name = name
+        self.setup = setup
+        self.description = description
+
+
+def _pictures(n: int) -> List[str]:
+    """
+    Return the paths of `n` synthetic JPEG pictures, generated on first use.
+    """
+    directory = os.path.join(tempfile.gettempdir(), "mozaik-benchmarks")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, f"picture-{i}.jpg")
+        if not os.path.exists(path):
+            noise = Image.effect_noise((1600, 1200), 32 + i % 64)
+            Image.merge("RGB", (noise, noise.rotate(90), noise.transpose(0))).save(
+                path, quality=90
+            )
+        paths.append(path)
+    return paths
+
+
+def _mosaic(n_regions: int) -> str:
+    # Square grid of 2x2 regions, each with its own character
+    n_cols = max(1, int(n_regions**0.5))
+    rows = []
+    for region_row in range((n_regions + n_cols - 1) // n_cols):
+        row = ""
+        for region_col in range(n_cols):
+            index = min(region_row * n_cols + region_col, n_regions - 1)
+            row += chr(0x4E00 + index) * 2
+        rows += [row, row]
+    return "\n".join(rows)
+
+
+def _deck(n_slides: int, content: str) -> List[Slide]:
+    pictures = []
+    if content in ("picture", "mixed"):
+        pictures = _pictures(min(n_slides, MAX_PICTURES))
+    elif content == "distinct":
+        # Every slide shows its own picture
+        pictures = _pictures(n_slides)
+    slides = []
+    for i in range(n_slides):
+        slide = Slide("aab\naac", title=f"Slide {i}")
+        for char in "abc":
+            rect = slide[char]
+            if content == "text":
+                rect.set_text(f"{i} {TEXT}")
+            elif content == "table":
+                rect.set_table([[f"{i}", "b", "c"] for _ in range(5)])
+            elif content == "picture":
+                rect.set_picture(pictures[i % len(pictures)], size_mode="fit")
+            elif content == "object":
+                rect.set_object(TextboxWithTitle(f"Object {i}", TEXT))
+            elif content == "distinct":
+                if char == "a":
+                    rect.set_picture(pictures[i])
+                else:
+                    rect.set_text(f"{i} {TEXT}")
+            elif content == "mixed":
+                if char == "a":
+                    rect.set_picture(pictures[i % len(pictures)])
+                elif char == "b":
+                    rect.set_text(f"{i} {TEXT}")
+                else:
+                    rect.set_table([[f"{i}", "b", "c"] for _ in range(5)])
+        slides.append(slide)
+    return slides
+
+
+def _compile_rects(content: str) -> Setup:
+    """
+    Measure the compilation of the rects of a deck, once the geometry is
+    calculated, the pictures are prepared and the PPT slides are added.
+    """
+
+    def setup(n_slides: int) -> Callable[[], None]:
+        presentation = Presentation(13.33, 7.5)
+        # Initialize an empty PowerPoint presentation
+        presentation.compile()
+        slides = _deck(n_slides, content)
+        presentation.calculate_geometry(slides)
+        presentation.prepare_pictures(slides)
+        pptx_slides = [presentation._add_pptx_slide() for _ in slides]
+
+        def run() -> None:
+            for pptx_slide, slide in zip(pptx_slides, slides):
+                for rect in slide.rects.values():
+                    presentation.compile_rect(pptx_slide, rect)
+
+        return run
+
+    return setup
+
+
+def _slide_construction(n_slides: int) -> Callable[[], None]:
+    def run() -> None:
+        for i in range(n_slides):
+            Slide("aab\naac\nddd", title=f"Slide {i}")
+
+    return run
+
+
+def _layout_parsing(n_regions: int) -> Callable[[], None]:
+    mosaic = _mosaic(n_regions)
+
+    def run() -> None:
+        # Parsed layouts are memoized
+        _parse_layout.cache_clear()
+        Slide(mosaic)
+
+    return run
+
+
+def _calculate_inches(n_slides: int) -> Callable[[], None]:
+    presentation = Presentation(13.33, 7.5)
+    slides = _deck(n_slides, None)
+    return lambda: presentation.calculate_geometry(slides)
+
+
+def _table_rows(n_rows: int) -> Callable[[], None]:
+    rows = [[f"{i}", "b", "c", "d"] for i in range(n_rows)]
+
+    def run() -> None:
+        presentation = Presentation(13.33, 7.5)
+        slide = Slide("a", title="Table")
+        slide["a"].set_table(rows, paginate=True)
+        presentation.add_slide(slide)
+        presentation.compile()
+
+    return run
+
+
+def _save(content: str, streaming: bool = False) -> Setup:
+    def setup(n_slides: int) -> Callable[[], None]:
+        presentation = Presentation(13.33, 7.5)
+        for slide in _deck(n_slides, content):
+            presentation.add_slide(slide)
+
+        def run() -> None:
+            with tempfile.TemporaryDirectory() as directory:
+                presentation.save(os.path.join(directory, "deck.pptx"), streaming)
+
+        return run
+
+    return setup
+
+
+CASES = [
+    Case("slide_construction", _slide_construction, "slides with a small mosaic"),
+    Case("layout_parsing", _layout_parsing, "regions of one large mosaic"),
+    Case("calculate_inches", _calculate_inches, "slides"),
+    Case("compile_text", _compile_rects("text"), "slides of 3 texts"),
+    Case("compile_table", _compile_rects("table"), "slides of 3 tables"),
+    Case("compile_picture", _compile_rects("picture"), "slides of 3 pictures"),
+    Case("compile_object", _compile_rects("object"), "slides of 3 objects"),
+    Case("table_rows", _table_rows, "rows of a paginated table"),
+    Case("save_text", _save("text"), "slides of 3 texts"),
+    Case("save_mixed", _save("mixed"), "slides of a picture, a text and a table"),
+    # The peak memory must not grow with the number of slides
+    Case(
+        "save_streaming",
+        _save("distinct", streaming=True),
+        "slides of a distinct picture and 2 texts",
+    ),
+]
+
+
+def measure(case: Case, size: int, repeat: int) -> Dict[str, float]:
+    seconds = []
+    for _ in range(repeat):
+        run = case.setup(size)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+
+    run = case.setup(size)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(seconds), "peak_bytes": peak}
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(case_names: List[str], sizes: List[int], repeat: int) -> Dict:
+    results = {}
+    for case in CASES:
+        if case_names and case.name not in case_names:
+            continue
+        results[case.name] = {}
+        for size in sizes:
+            result = measure(case, size, repeat)
+            results[case.name][str(size)] = result
+            print(
+                f"{case.name:<20}{size:>7} {case.description:<40}"
+                f"{result['seconds']:>10.4f} s{result['peak_bytes'] / 2**20:>10.1f} MiB",
+                flush=True,
+            )
+    return {
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> bool:
+    """
+    Print the ratio of time and peak memory between two runs of the suite.
+    Return whether any case is slower than `threshold` times the former run.
+    """
+    print(f"{before['revision']} -> {after['revision']}")
+    print(
+        f"{'case':<20}{'size':>7}{'seconds':>21}{'ratio':>8}{'peak MiB':>21}{'ratio':>8}"
+    )
+    regressed = False
+    for name, sizes in after["results"].items():
+        for size, result in sizes.items():
+            previous = before["results"].get(name, {}).get(size)
+            if previous is None:
+                continue
+            time_ratio = result["seconds"] / max(previous["seconds"], 1e-9)
+            memory_ratio = result["peak_bytes"] / max(previous["peak_bytes"], 1)
+            marker = ""
+            if time_ratio > threshold:
+                marker = " <- slower"
+                regressed = True
+            print(
+                f"{name:<20}{size:>7}"
+                f"{previous['seconds']:>10.4f} ->{result['seconds']:>8.4f}"
+                f"{time_ratio:>8.2f}"
+                f"{previous['peak_bytes'] / 2**20:>10.1f} ->"
+                f"{result['peak_bytes'] / 2**20:>8.1f}{memory_ratio:>8.2f}{marker}"
+            )
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cases", nargs="*", default=[], help="cases to run")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measure")
+    parser.add_argument("--output", help="write the results to a JSON file")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="compare the results of two runs instead of running the suite",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.1,
+        help="time ratio reported as a regression by --compare",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            regressed = compare(json.load(before), json.load(after), args.threshold)
+        sys.exit(1 if regressed else 0)
+
+    unknown_cases = set(args.cases) - {case.name for case in CASES}
+    if unknown_cases:
+        parser.error(
+            f"Unknown cases: {', '.join(sorted(unknown_cases))}"
+            + f"\nAvailable cases: {', '.join(case.name for case in CASES)}"
+        )
+
+    report = run_suite(args.cases, args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the import time of mozaik.
+
+Importing mozaik and defining slides must not import python-pptx, lxml or the
+image libraries, which are only needed to compile. Each run imports mozaik in
+a fresh interpreter, builds a few slides, and reports the time of the import.
+The script fails when a heavy module was imported, or when the import is
+slower than --max-ms:
+
+    python benchmarks/import_time.py --max-ms 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules only needed to compile a presentation
+HEAVY_MODULES = ["PIL", "asyncio", "lxml", "matplotlib", "numpy", "pptx"]
+
+SCRIPT = f"""
+import json, sys, time
+sys.path.insert(0, {ROOT!r})
+start = time.perf_counter()
+import mozaik
+seconds = time.perf_counter() - start
+
+slide = mozaik.Slide("ab\\nac", title="Slide")
+slide["a"].set_text("text")
+slide["b"].set_picture("picture.jpg")
+slide["c"].set_table([["a", "b"], ["c", "d"]])
+
+heavy_modules = sorted({{name.split(".")[0] for name in sys.modules}} & set({HEAVY_MODULES!r}))
+print(json.dumps({{"seconds": seconds, "heavy_modules": heavy_modules}}))
+"""
+
+
+def measure(repeat: int) -> dict:
+    """
+    Return the best import time of `repeat` runs, and the heavy modules
+    imported by any of them.
+    """
+    seconds = []
+    heavy_modules = set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output)
+        seconds.append(result["seconds"])
+        heavy_modules.update(result["heavy_modules"])
+    return {"seconds": min(seconds), "heavy_modules": sorted(heavy_modules)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=10, help="fresh imports")
+    parser.add_argument(
+        "--max-ms", type=float, help="import time reported as a regression"
+    )
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    print(f"import mozaik{result['seconds'] * 1000:>10.1f} ms")
+    failed = False
+    if result["heavy_modules"]:
+        print(f"Heavy modules imported: {', '.join(result['heavy_modules'])}")
+        failed = True
+    if args.max_ms is not None and result["seconds"] * 1000 > args.max_ms:
+        print(f"Import is slower than {args.max_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,11 +20,10 @@ table_data = [
 x = np.linspace(0, 10, 100)
 y = np.sin(x)
 y2 = np.sin(x + 0.5)
-plt.figure(figsize=(5, 2))
+figure = plt.figure(figsize=(5, 2))
 plt.plot(x, y)
 plt.plot(x, y2)
 plt.title("Sinusoidal data")
-plt.savefig("sinusoidal.png", bbox_inches="tight")
 
 slide = Slide(
     """
@@ -40,7 +39,8 @@ slide["c"].set_text(
     "Who cares about the table, we can add a picture or a text.",
     horizontal_alignment="right",
 )
-slide["d"].set_picture("sinusoidal.png", size_mode="fit")
+# The figure is rendered when the presentation is saved, no file needed
+slide["d"].set_picture(figure, size_mode="fit")
 
 presentation = Presentation(presentation_width=10, presentation_height=7.5)
 presentation.add_slide(slide)
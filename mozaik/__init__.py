@@ -1,2 +1,44 @@
-from .presentation import Presentation
+"""
+Slides are defined without python-pptx, which is only imported along with
+the classes compiling presentations, on first access.
+"""
+from typing import TYPE_CHECKING, Any
+
+from .profiling import Profiler
 from .slide import Slide
+from .validation import ValidationError
+
+if TYPE_CHECKING:
+    from .aio import AsyncRunner
+    from .presentation import Presentation
+    from .template import SlideTemplate
+
+# Name -> module of the attributes imported on first access
+_LAZY_ATTRIBUTES = {
+    "AsyncRunner": ".aio",
+    "Presentation": ".presentation",
+    "SlideTemplate": ".template",
+}
+
+__all__ = [
+    "AsyncRunner",
+    "Presentation",
+    "Profiler",
+    "Slide",
+    "SlideTemplate",
+    "ValidationError",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,118 @@
+"""
+Compilation of presentations from an event loop.
+
+Compiling and saving are CPU-bound and read pictures from disk, so they run on
+a thread pool (the default executor of the loop, unless another one is given)
+while the loop keeps serving other tasks. Compilations share the presentation
+with the loop, so they can not run in other processes: the slides are built in
+worker processes with `config["compile_workers"]` instead. A runner bounds the
+number of compilations running at once, and a presentation is only compiled by
+one of them at a time.
+
+Cancelling the awaiting task stops the compilation at the next slide. The
+task is only cancelled once the compilation stopped, so that the presentation
+is no longer in use, and the next compilation of the presentation starts over.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Optional, Union
+
+from .presentation import CompilationCancelled, Presentation
+
+
+class AsyncRunner:
+    """
+    Runs the compilations of presentations on `executor`, a thread pool (the
+    default executor of the loop when None), at most `max_concurrency` at once
+    (no limit when None). A runner is meant to be used from a single event
+    loop.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[ThreadPoolExecutor] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+            raise TypeError(
+                f"Unsupported executor: {type(executor).__name__}"
+                + "\nCompilations run on a ThreadPoolExecutor, use"
+                + ' config["compile_workers"] to build slides in processes'
+            )
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _run_locked(
+        self,
+        presentation: Presentation,
+        event: threading.Event,
+        func: Callable[..., Any],
+    ) -> Any:
+        # Runs on the executor
+        with presentation._lock:
+            presentation._cancel_event = event
+            try:
+                presentation._check_cancelled()
+                return func()
+            finally:
+                presentation._cancel_event = None
+
+    async def _run(self, presentation: Presentation, func: Callable[..., Any]) -> Any:
+        if self._semaphore is None and self.max_concurrency is not None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore is not None:
+            async with self._semaphore:
+                return await self._run_cancellable(presentation, func)
+        return await self._run_cancellable(presentation, func)
+
+    async def _run_cancellable(
+        self, presentation: Presentation, func: Callable[..., Any]
+    ) -> Any:
+        event = threading.Event()
+        # The compilation runs in the context of the task, so that it is only
+        # measured by the profilers of the task
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            context.run,
+            functools.partial(self._run_locked, presentation, event, func),
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            event.set()
+            await asyncio.wait([future])
+            if not future.cancelled() and future.exception() is not None:
+                if not isinstance(future.exception(), CompilationCancelled):
+                    raise future.exception()
+            raise
+
+    async def compile(self, presentation: Presentation, force: bool = False) -> None:
+        """
+        Compile `presentation`, like `Presentation.compile`.
+        """
+        await self._run(presentation, functools.partial(presentation.compile, force))
+
+    async def save(
+        self,
+        presentation: Presentation,
+        name: Union[str, os.PathLike, BinaryIO],
+        streaming: bool = False,
+    ) -> None:
+        """
+        Save `presentation` to a file or a writable binary stream, like
+        `Presentation.save`. Streams are written from the executor.
+        """
+        await self._run(
+            presentation, functools.partial(presentation.save, name, streaming)
+        )
+
+
+# Runner of `Presentation.compile_async` and `Presentation.save_async`, on the
+# default executor of the loop, without limit
+default_runner = AsyncRunner()
@@ -0,0 +1,245 @@
+"""
+Generation of many decks in one run.
+
+Decks are described by specs, each turned into a presentation by a `build`
+function. Decks are built and saved by a pool of worker processes, each
+keeping the pictures it read and prepared (like logos and backgrounds) for the
+next decks it builds. Finished decks are written to a directory, or handed
+to a callback in the main process, as soon as they are done.
+
+A deck failing to build or save is reported along with the others, without
+stopping the batch. When a worker dies (like when it runs out of memory), the
+decks it was running are reported as failed, and the other decks are
+generated by a new pool.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .picture.picture_cache import SharedPictures
+from .presentation import Presentation, config
+
+# Pictures shared by the decks built by this process
+_shared_pictures = SharedPictures()
+# Queue of the worker processes, receiving the index of each deck they start
+_started: Optional[Any] = None
+
+# A deck of a batch: its index in the batch, its name and its spec
+Deck = Tuple[int, str, Any]
+
+
+class DeckResult:
+    """
+    Outcome of a deck of a batch: where it was written, the time it took to
+    build and save it, and the error if it failed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        seconds: float,
+        path: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.seconds = seconds
+        # Path of the deck written to the output directory
+        self.path = path
+        # Traceback of the error, for failed decks
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        status = "ok" if self.ok else "failed"
+        return f"{self.name}: {status}, seconds={self.seconds:.3f}"
+
+
+def _write_atomically(path: str, blob: bytes) -> None:
+    # Written under a temporary name, so that incomplete decks never show up
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(blob)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def generate_deck(
+    name: str,
+    spec: Any,
+    build: Callable[[Any], Presentation],
+    output_dir: Optional[str],
+    deck_config: Dict[str, Any],
+) -> Tuple[DeckResult, Optional[bytes]]:
+    """
+    Build and save a deck. Return its result, and the deck itself when it is
+    not written to `output_dir`. This runs in the worker processes.
+    """
+    config.update(deck_config)
+    start = time.perf_counter()
+    try:
+        presentation = build(spec)
+        presentation.shared_pictures = _shared_pictures
+        output = BytesIO()
+        presentation.save(output)
+        path = None
+        if output_dir is not None:
+            path = os.path.join(output_dir, f"{name}.pptx")
+            _write_atomically(path, output.getvalue())
+        result = DeckResult(name, time.perf_counter() - start, path)
+        return result, None if output_dir is not None else output.getvalue()
+    except Exception:
+        seconds = time.perf_counter() - start
+        return DeckResult(name, seconds, error=traceback.format_exc()), None
+    finally:
+        _shared_pictures.trim()
+
+
+def _init_worker(started: Any) -> None:
+    global _started
+    _started = started
+
+
+def _generate_started_deck(
+    index: int, name: str, *args: Any
+) -> Tuple[DeckResult, Optional[bytes]]:
+    # Reported before building, so that the decks running in a worker are
+    # known when the worker dies
+    _started.put(index)
+    return generate_deck(name, *args)
+
+
+def generate_decks(
+    specs: Iterable[Tuple[str, Any]],
+    build: Callable[[Any], Presentation],
+    output_dir: Optional[str] = None,
+    callback: Optional[Callable[[str, bytes], None]] = None,
+    workers: Optional[int] = None,
+) -> Iterator[DeckResult]:
+    """
+    Generate a deck for each `(name, spec)` of `specs`, where `build(spec)`
+    returns the presentation of the deck. Decks are written to
+    `output_dir/name.pptx`, or passed as bytes to `callback(name, deck)`.
+    Results are yielded as decks are done, which is not the order of `specs`.
+
+    Decks are generated by `workers` processes (None uses all CPUs), so
+    `build` and the specs must be picklable. Specs are only read as workers
+    need them.
+    """
+    if (output_dir is None) == (callback is None):
+        raise ValueError("Decks need either an output directory or a callback")
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def finish(result: DeckResult, blob: Optional[bytes]) -> DeckResult:
+        if callback is not None and result.ok:
+            try:
+                callback(result.name, blob)
+            except Exception:
+                result.error = traceback.format_exc()
+        return result
+
+    if workers == 1:
+        for name, spec in specs:
+            yield finish(*generate_deck(name, spec, build, output_dir, dict(config)))
+        return
+
+    n_workers = workers or os.cpu_count() or 1
+    started = multiprocessing.SimpleQueue()
+
+    def new_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(started,)
+        )
+
+    executor = new_executor()
+    pending: Dict[Future, Deck] = {}
+    # Decks started and not done yet
+    running: Set[int] = set()
+    # Decks of a broken pool which never started, generated again first
+    retried: List[Deck] = []
+    decks = ((index, name, spec) for index, (name, spec) in enumerate(specs))
+    try:
+        while True:
+            # A few decks per worker are in flight, so that specs are read
+            # lazily and finished decks do not pile up
+            while len(pending) < 2 * n_workers:
+                deck = retried.pop(0) if retried else next(decks, None)
+                if deck is None:
+                    break
+                index, name, spec = deck
+                try:
+                    future = executor.submit(
+                        _generate_started_deck,
+                        index,
+                        name,
+                        spec,
+                        build,
+                        output_dir,
+                        dict(config),
+                    )
+                except BrokenProcessPool:
+                    # An idle worker died
+                    retried.insert(0, deck)
+                    executor.shutdown()
+                    executor = new_executor()
+                    continue
+                except Exception:
+                    # Like when the spec can not be pickled
+                    yield DeckResult(name, 0.0, error=traceback.format_exc())
+                    continue
+                pending[future] = deck
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            while not started.empty():
+                running.add(started.get())
+            lost = []
+            for future in done:
+                index, name, _ = deck = pending.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    lost.append(deck)
+                    continue
+                running.discard(index)
+                try:
+                    result, blob = future.result()
+                except Exception:
+                    # Like when the result can not be pickled
+                    yield DeckResult(name, 0.0, error=traceback.format_exc())
+                    continue
+                yield finish(result, blob)
+            if not lost:
+                continue
+
+            # A worker died, which failed every deck left in the pool
+            executor.shutdown()
+            lost += pending.values()
+            pending.clear()
+            while not started.empty():
+                running.add(started.get())
+            lost.sort(key=lambda deck: deck[0])
+            in_flight = {index for index, _, _ in lost if index in running}
+            running.clear()
+            for index, name, spec in lost:
+                # Decks which never started did not kill the worker, unless no
+                # deck started at all
+                if in_flight and index not in in_flight:
+                    retried.append((index, name, spec))
+                    continue
+                error = f"The worker generating the deck {name!r} died"
+                yield DeckResult(name, 0.0, error=error)
+            executor = new_executor()
+    finally:
+        executor.shutdown()
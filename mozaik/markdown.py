@@ -0,0 +1,418 @@
+"""
+Markdown content of rects, and decks compiled from Markdown documents.
+
+The Markdown of a rect is parsed into paragraphs (headings, lists, code
+blocks) made of runs with their emphasis, code and links, and the paragraphs
+are rendered to the XML of the textbox in one go, like table rows.
+
+Documents are read line by line and turned into slides on the fly: headings
+up to `slide_level` start slides titled after them, standalone images and
+tables get their own rects next to the text, and slides continue on the next
+slides (with the same title) once they hold enough text or visuals. Only the
+slide being filled is kept in memory, so documents of any size are compiled
+with `Presentation.save_slides`.
+
+Parsing does not import python-pptx.
+"""
+import os
+import re
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .slide import Slide
+
+# Run of text: text, bold, italic, code, and URL of its link
+Span = Tuple[str, bool, bool, bool, Optional[str]]
+# Paragraph: kind (paragraph, heading, bullet, number or code), list level,
+# list marker (like "3."), and runs
+Block = Tuple[str, int, str, List[Span]]
+
+_INLINE = re.compile(
+    r"\\([\\`*_\[\]()#+\-.!|])"  # escaped character
+    r"|`([^`]+)`"  # code
+    r"|\*\*(.+?)\*\*|__(.+?)__"  # bold
+    r"|\*(.+?)\*|(?<!\w)_(.+?)_(?!\w)"  # italic
+    r"|(!?)\[([^\]]*)\]\(\s*<?([^)\s>]+)>?(?:\s+\"[^\"]*\")?\s*\)"  # link, image
+)
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]|\d{1,9}[.)])\s+(.*)$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_THEMATIC_BREAK = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_IMAGE_LINE = re.compile(
+    r"^\s*!\[([^\]]*)\]\(\s*<?([^)\s>]+)>?(?:\s+\"[^\"]*\")?\s*\)\s*$"
+)
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_TABLE_CELL_SEPARATOR = re.compile(r"(?<!\\)\|")
+
+# Chars of the rects of the pictures and tables of a slide
+_VISUAL_CHARS = "uvwxyz"
+
+# Indentation of a list level, in spaces
+_LIST_INDENT = 2
+_MAX_LIST_LEVEL = 8
+
+
+def parse_inline(
+    text: str,
+    bold: bool = False,
+    italic: bool = False,
+    url: Optional[str] = None,
+) -> List[Span]:
+    """
+    Parse the emphasis, code spans and links of a line of Markdown into runs.
+    Images inside text are replaced by their alternative text.
+    """
+    spans = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            spans.append((text[position : match.start()], bold, italic, False, url))
+        escaped, code, bold_1, bold_2, italic_1, italic_2 = match.groups()[:6]
+        is_image, link_text, link_url = match.groups()[6:]
+        if escaped is not None:
+            spans.append((escaped, bold, italic, False, url))
+        elif code is not None:
+            spans.append((code, bold, italic, True, url))
+        elif bold_1 is not None or bold_2 is not None:
+            spans.extend(parse_inline(bold_1 or bold_2, True, italic, url))
+        elif italic_1 is not None or italic_2 is not None:
+            spans.extend(parse_inline(italic_1 or italic_2, bold, True, url))
+        elif is_image:
+            spans.append((link_text, bold, italic, False, url))
+        else:
+            spans.extend(parse_inline(link_text, bold, italic, link_url))
+        position = match.end()
+    if position < len(text):
+        spans.append((text[position:], bold, italic, False, url))
+    return spans
+
+
+def plain_text(spans: List[Span]) -> str:
+    return "".join(span[0] for span in spans)
+
+
+def parse_markdown(text: str) -> List[Block]:
+    """
+    Parse the Markdown of a rect into paragraphs. Lines of a paragraph or a
+    list item are joined, and tables are kept as text.
+    """
+    blocks: List[Block] = []
+    # Kind, level, marker and lines of the paragraph being read
+    current: Optional[Tuple[str, int, str, List[str]]] = None
+    in_code = False
+
+    def finish() -> None:
+        nonlocal current
+        if current is not None:
+            kind, level, marker, lines = current
+            blocks.append((kind, level, marker, parse_inline(" ".join(lines))))
+            current = None
+
+    for line in text.split("\n"):
+        if _FENCE.match(line):
+            finish()
+            in_code = not in_code
+            continue
+        if in_code:
+            blocks.append(("code", 0, "", [(line, False, False, True, None)]))
+            continue
+        if not line.strip():
+            finish()
+            continue
+
+        heading = _HEADING.match(line)
+        list_item = _LIST_ITEM.match(line)
+        if heading is not None:
+            finish()
+            spans = parse_inline(heading[2], bold=True)
+            blocks.append(("heading", len(heading[1]), "", spans))
+        elif _THEMATIC_BREAK.match(line):
+            finish()
+        elif list_item is not None:
+            finish()
+            indent, marker, item = list_item.groups()
+            level = min(len(indent.expandtabs(4)) // _LIST_INDENT, _MAX_LIST_LEVEL)
+            kind = "bullet" if marker in "-*+" else "number"
+            current = (kind, level, "" if kind == "bullet" else marker, [item])
+        elif current is not None:
+            # Lazy continuation of the paragraph or list item
+            current[3].append(line.strip().lstrip("> "))
+        else:
+            current = ("paragraph", 0, "", [line.strip().lstrip("> ")])
+    finish()
+    return blocks
+
+
+def markdown_plain_text(blocks: List[Block]) -> str:
+    """
+    Return the text of the paragraphs as laid out in the textbox, with the
+    bullets and numbers of the lists, to measure it.
+    """
+    lines = []
+    for kind, level, marker, spans in blocks:
+        prefix = ""
+        if kind == "bullet":
+            prefix = "    " * level + "• "
+        elif kind == "number":
+            prefix = "    " * level + marker + " "
+        lines.append(prefix + plain_text(spans))
+    return "\n".join(lines)
+
+
+def fill_markdown(
+    text_frame: Any,
+    blocks: List[Block],
+    font_size: Optional[float] = None,
+    relate_hyperlink: Optional[Callable[[str], str]] = None,
+) -> int:
+    """
+    Replace the paragraphs of a python-pptx text frame with `blocks`, at
+    `font_size` (in inches) or the default size when it is None. Links are
+    related to the slide by `relate_hyperlink(url)`, which returns their rId.
+    Return the number of bytes of the XML.
+    """
+    from pptx.oxml import parse_xml
+    from pptx.oxml.ns import nsdecls
+    from xml.sax.saxutils import escape, quoteattr
+
+    from .table.table_builder import _INVALID_XML_CHARS
+
+    size = "" if font_size is None else f' sz="{round(font_size * 7200)}"'
+    paragraphs = []
+    for kind, level, marker, spans in blocks:
+        if kind == "bullet":
+            # Hanging bullets, indented by level
+            margin = 285750 * (level + 1)
+            properties = (
+                f'<a:pPr marL="{margin}" indent="-285750">'
+                '<a:buFont typeface="Arial"/><a:buChar char="•"/></a:pPr>'
+            )
+        elif kind == "number":
+            margin = 342900 * (level + 1)
+            properties = f'<a:pPr marL="{margin}" indent="-342900"><a:buNone/></a:pPr>'
+            spans = [(marker + " ", False, False, False, None)] + spans
+        else:
+            properties = ""
+
+        runs = []
+        for text, bold, italic, code, url in spans:
+            if not text:
+                continue
+            text = _INVALID_XML_CHARS.sub(
+                lambda match: "_x%04X_" % ord(match.group()), escape(text)
+            )
+            attributes = (
+                size + (' b="1"' if bold else "") + (' i="1"' if italic else "")
+            )
+            children = '<a:latin typeface="Courier New"/>' if code else ""
+            if url is not None and relate_hyperlink is not None:
+                children += f"<a:hlinkClick r:id={quoteattr(relate_hyperlink(url))}/>"
+            runs.append(
+                f'<a:r><a:rPr lang="en-US"{attributes} dirty="0">{children}</a:rPr>'
+                f"<a:t>{text}</a:t></a:r>"
+            )
+        end = f'<a:endParaRPr lang="en-US"{size} dirty="0"/>'
+        paragraphs.append(f"<a:p>{properties}{''.join(runs)}{end}</a:p>")
+    if not paragraphs:
+        paragraphs.append("<a:p/>")
+
+    txBody_xml = f"<a:txBody {nsdecls('a', 'r')}>{''.join(paragraphs)}</a:txBody>"
+    txBody = text_frame._txBody
+    for p in txBody.p_lst:
+        txBody.remove(p)
+    txBody.extend(list(parse_xml(txBody_xml)))
+    return len(txBody_xml)
+
+
+def _table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    cells = _TABLE_CELL_SEPARATOR.split(line)
+    return [
+        plain_text(parse_inline(cell.strip().replace("\\|", "|"))) for cell in cells
+    ]
+
+
+class _SlideBuilder:
+    """
+    Content of the slide being filled from a document.
+    """
+
+    def __init__(
+        self,
+        slide_level: int,
+        max_chars: int,
+        max_visuals: int,
+        base_dir: Optional[str],
+    ):
+        self.slide_level = slide_level
+        self.max_chars = max_chars
+        self.max_visuals = max_visuals
+        self.base_dir = base_dir
+        self.title: Optional[str] = None
+        # Whether a slide was made for the current title
+        self.has_slide = True
+        self.text_lines: List[str] = []
+        self.n_chars = 0
+        # ("picture", path) or ("table", rows)
+        self.visuals: List[Tuple[str, object]] = []
+        self.table_rows: List[List[str]] = []
+        self.in_code = False
+
+    def make_slide(self) -> Optional[Slide]:
+        """
+        Return the slide of the content read so far, and start a new one with
+        the same title. Return None when there is no content, unless the
+        title has no slide yet.
+        """
+        text = "\n".join(self.text_lines).strip("\n")
+        visuals = self.visuals
+        self.text_lines = []
+        self.n_chars = 0
+        self.visuals = []
+        if not text.strip() and not visuals:
+            if self.has_slide:
+                return None
+            self.has_slide = True
+            return Slide("t", title=self.title)
+
+        # Text on the left, visuals on the right, one above the other
+        chars = _VISUAL_CHARS[: len(visuals)]
+        if not text.strip():
+            layout = chars
+        elif not visuals:
+            layout = "t"
+        else:
+            layout = "\n".join("t" + char for char in chars)
+        slide = Slide(layout, title=self.title)
+        if text.strip():
+            slide["t"].set_markdown(text, fit="shrink")
+        for char, (kind, value) in zip(chars, visuals):
+            if kind == "picture":
+                slide[char].set_picture(value, size_mode="fit")
+            else:
+                slide[char].set_table(value, paginate=True)
+        self.has_slide = True
+        return slide
+
+    def add_visual(self, kind: str, value: object) -> Optional[Slide]:
+        slide = None
+        if len(self.visuals) >= self.max_visuals:
+            slide = self.make_slide()
+        self.visuals.append((kind, value))
+        return slide
+
+    def finish_table(self) -> Optional[Slide]:
+        # Cells beyond the header row have no column
+        rows = [row[: len(self.table_rows[0])] for row in self.table_rows]
+        self.table_rows = []
+        return self.add_visual("table", rows)
+
+    def add_text(self, line: str) -> Iterator[Slide]:
+        # Blocks starting past the characters of a slide continue on the next
+        # slide, and other lines stay with their block
+        starts_block = not self.in_code and (
+            not self.text_lines or not self.text_lines[-1]
+        )
+        if starts_block and self.n_chars + len(line) > self.max_chars:
+            slide = self.make_slide()
+            if slide is not None:
+                yield slide
+        self.text_lines.append(line)
+        self.n_chars += len(line)
+
+    def read_line(self, line: str) -> Iterator[Slide]:
+        """
+        Read a line of the document, and yield the slides it completes.
+        """
+        if _FENCE.match(line):
+            yield from self.add_text(line)
+            self.in_code = not self.in_code
+            return
+        if self.in_code:
+            yield from self.add_text(line)
+            return
+
+        is_table_line = line.lstrip().startswith("|")
+        if self.table_rows and not is_table_line:
+            slide = self.finish_table()
+            if slide is not None:
+                yield slide
+        if is_table_line:
+            if not _TABLE_SEPARATOR.match(line):
+                self.table_rows.append(_table_row(line))
+            return
+
+        heading = _HEADING.match(line)
+        image = _IMAGE_LINE.match(line)
+        if heading is not None and len(heading[1]) <= self.slide_level:
+            slide = self.make_slide()
+            if slide is not None:
+                yield slide
+            self.title = plain_text(parse_inline(heading[2]))
+            self.has_slide = False
+        elif _THEMATIC_BREAK.match(line) and (
+            not self.text_lines or not self.text_lines[-1]
+        ):
+            # Breaks start a new slide, unless they underline a paragraph as a
+            # heading
+            slide = self.make_slide()
+            if slide is not None:
+                yield slide
+        elif image is not None and "://" in image[2]:
+            # Remote images are not downloaded, they are linked from the text
+            yield from self.add_text(f"[{image[1] or image[2]}]({image[2]})")
+        elif image is not None:
+            path = image[2]
+            if self.base_dir is not None:
+                path = os.path.join(self.base_dir, path)
+            slide = self.add_visual("picture", path)
+            if slide is not None:
+                yield slide
+        elif not line.strip():
+            # Slides only continue between blocks
+            if self.n_chars >= self.max_chars:
+                slide = self.make_slide()
+                if slide is not None:
+                    yield slide
+            else:
+                self.text_lines.append("")
+        else:
+            yield from self.add_text(line)
+
+
+def iter_markdown_slides(
+    lines: Iterable[str],
+    slide_level: int = 2,
+    max_chars: int = 800,
+    max_visuals: int = 2,
+    base_dir: Optional[str] = None,
+) -> Iterator[Slide]:
+    """
+    Turn a Markdown document, given as lines (like an open file), into
+    slides as it is read. Headings up to `slide_level` start a new slide
+    titled after them, and deeper headings stay in the text. Text is shrunk
+    to fit its rect, and continues on a new slide after `max_chars`
+    characters. Standalone images and tables are shown next to the text, at
+    most `max_visuals` per slide. Images are relative to `base_dir`, and
+    remote images (URLs) are shown as links in the text, titled after their
+    alternative text.
+    """
+    if not 1 <= max_visuals <= len(_VISUAL_CHARS):
+        raise ValueError(
+            f"Unsupported number of visuals per slide: {max_visuals}"
+            + f"\nAvailable numbers: 1 to {len(_VISUAL_CHARS)}"
+        )
+    builder = _SlideBuilder(slide_level, max_chars, max_visuals, base_dir)
+    for line in lines:
+        yield from builder.read_line(line.rstrip("\r\n"))
+
+    if builder.table_rows:
+        slide = builder.finish_table()
+        if slide is not None:
+            yield slide
+    slide = builder.make_slide()
+    if slide is not None:
+        yield slide
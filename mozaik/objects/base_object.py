@@ -1,11 +1,23 @@
 from __future__ import annotations
 from abc import ABCMeta, abstractmethod
-from pptx.slide import SlideShapes
+from typing import TYPE_CHECKING, Hashable, Optional
 
 import mozaik.slide
 
+if TYPE_CHECKING:
+    from pptx.slide import SlideShapes
+
 
 class BaseObject:
+    def cache_key(self) -> Optional[Hashable]:
+        """
+        Return a key identifying the shapes built by `attach`, or None to build
+        them on every placement. Objects of the same class with equal keys
+        must build the same shapes in rects of the same size: the shapes are
+        then built once per compilation and cloned for the later placements.
+        """
+        return None
+
     @abstractmethod
     def attach(cls, slide: SlideShapes, rect: mozaik.slide.Rect) -> None:
         raise NotImplementedError()
@@ -0,0 +1,153 @@
+from typing import Any, List, Optional, Sequence
+
+from pptx.chart.data import (
+    CategoryChartData,
+    CategorySeriesData,
+    XyChartData,
+    XySeriesData,
+)
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
+from pptx.util import Inches
+
+from .base_object import BaseObject
+
+_CHART_TYPES = {
+    "line": XL_CHART_TYPE.LINE,
+    "bar": XL_CHART_TYPE.COLUMN_CLUSTERED,
+    "barh": XL_CHART_TYPE.BAR_CLUSTERED,
+    "scatter": XL_CHART_TYPE.XY_SCATTER,
+}
+
+
+def _to_list(values: Any) -> List[Any]:
+    """
+    Convert a series to a list in one go, with missing values (NaN) as None.
+    """
+    if hasattr(values, "tolist"):
+        # NumPy arrays and pandas series are converted in C
+        values = values.tolist()
+    else:
+        values = list(values)
+    if any(value != value for value in values if isinstance(value, float)):
+        values = [None if value != value else value for value in values]
+    return values
+
+
+def _to_columns(y: Any) -> List[List[Any]]:
+    # A 2D array holds a series per column
+    if getattr(y, "ndim", None) == 2:
+        return [_to_list(column) for column in y.T]
+    if getattr(y, "ndim", None) == 1 or not len(y) or not hasattr(y[0], "__len__"):
+        return [_to_list(y)]
+    return [_to_list(column) for column in y]
+
+
+class _ListCategorySeriesData(CategorySeriesData):
+    # Holds the values as a list rather than as a data point per value
+    def __init__(self, chart_data, name, values: List[Any]):
+        super().__init__(chart_data, name, None)
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def values(self) -> List[Any]:
+        return self._values
+
+
+class _ListXySeriesData(XySeriesData):
+    # Holds the values as lists rather than as a data point per value
+    def __init__(self, chart_data, name, x_values: List[Any], y_values: List[Any]):
+        super().__init__(chart_data, name, None)
+        self._x_values = x_values
+        self._y_values = y_values
+
+    def __len__(self) -> int:
+        return len(self._y_values)
+
+    @property
+    def x_values(self) -> List[Any]:
+        return self._x_values
+
+    @property
+    def y_values(self) -> List[Any]:
+        return self._y_values
+
+
+class Chart(BaseObject):
+    """
+    Native PowerPoint chart of one or more series.
+
+    `y` is a series, a sequence of series, a 2D array with a series per column,
+    or a dict mapping series names to series. `x` holds the categories of line
+    and bar charts, or the X values of scatter charts.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        y: Any,
+        x: Optional[Sequence[Any]] = None,
+        names: Optional[Sequence[str]] = None,
+        title: Optional[str] = None,
+        number_format: str = "General",
+    ):
+        if kind not in _CHART_TYPES:
+            raise ValueError(
+                f"Unknown chart kind: {kind}"
+                + f"\nAvailable kinds: {', '.join(_CHART_TYPES)}"
+            )
+
+        if isinstance(y, dict):
+            names = list(y.keys())
+            y = list(y.values())
+        self.kind = kind
+        self.columns = _to_columns(y)
+        n_points = len(self.columns[0])
+        if any(len(column) != n_points for column in self.columns):
+            raise ValueError("All series of a chart must have the same length")
+
+        self.x = list(range(n_points)) if x is None else _to_list(x)
+        if len(self.x) != n_points:
+            raise ValueError(
+                f"Chart has {len(self.x)} X values for series of {n_points} values"
+            )
+        if names is None:
+            names = [f"Series {i + 1}" for i in range(len(self.columns))]
+        self.names = list(names)
+        self.title = title
+        self.number_format = number_format
+
+    def _chart_data(self) -> Any:
+        if self.kind == "scatter":
+            chart_data = XyChartData(self.number_format)
+            for name, column in zip(self.names, self.columns):
+                chart_data.append(_ListXySeriesData(chart_data, name, self.x, column))
+        else:
+            chart_data = CategoryChartData(self.number_format)
+            chart_data.categories = self.x
+            for name, column in zip(self.names, self.columns):
+                chart_data.append(_ListCategorySeriesData(chart_data, name, column))
+        return chart_data
+
+    def attach(self, slide, rect):
+        rect.apply_margin()
+        chart = slide.shapes.add_chart(
+            _CHART_TYPES[self.kind],
+            Inches(rect.left_inch),
+            Inches(rect.top_inch),
+            Inches(rect.width_inch),
+            Inches(rect.height_inch),
+            self._chart_data(),
+        ).chart
+
+        chart.has_title = self.title is not None
+        if self.title is not None:
+            chart.chart_title.text_frame.text = self.title
+
+        # A legend is only needed to tell several series apart
+        chart.has_legend = len(self.columns) > 1
+        if chart.has_legend:
+            chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+            chart.legend.include_in_layout = False
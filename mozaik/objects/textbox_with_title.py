@@ -1,16 +1,25 @@
-from pptx.util import Inches
-from pptx.dml.color import RGBColor
-
 from .base_object import BaseObject
 
 
 class TextboxWithTitle(BaseObject):
-    def __init__(self, title, text, title_font_size: float = 0.3):
+    def __init__(self, title, text, title_font_size: float = 0.3, fit: bool = False):
         self.title = title
         self.text = text
         self.title_font_size = title_font_size
+        # Shrink the text to the largest font size fitting the textbox
+        self.fit = fit
+
+    def cache_key(self):
+        return (self.title, self.text, self.title_font_size, self.fit)
 
     def attach(self, slide, rect):
+        # python-pptx is only needed once compiling
+        from pptx.dml.color import RGBColor
+        from pptx.util import Inches, Pt
+
+        from ..presentation import config
+        from ..text_fit import text_fitter
+
         rect.apply_margin()
         textbox = slide.shapes.add_textbox(
             Inches(rect.left_inch),
@@ -38,5 +47,19 @@ class TextboxWithTitle(BaseObject):
         textbox.text_frame.word_wrap = True
         textbox.text_frame.auto_size = False
         textbox.text_frame.text = self.text
+        if self.fit:
+            fitter = text_fitter(
+                config["text_font_path"],
+                config["text_font_size"],
+                config["text_min_font_size"],
+            )
+            font_size = fitter.shrink(
+                self.text,
+                rect.width_inch,
+                rect.height_inch - self.title_font_size - 0.2,
+            )
+            for paragraph in textbox.text_frame.paragraphs:
+                for run in paragraph.runs:
+                    run.font.size = Pt(round(font_size * 72, 2))
         textbox.fill.solid()
         textbox.fill.fore_color.rgb = RGBColor(255, 220, 220)
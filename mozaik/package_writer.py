@@ -0,0 +1,629 @@
+"""
+Streaming writer of PowerPoint packages.
+
+Slides are written to the ZIP archive as soon as they are built, along with the
+parts they own (pictures, charts, embedded workbooks), so they can be released
+right away. The parts shared by all slides (masters, layouts, theme) and the
+presentation part listing the slides are written last.
+
+Parts owned by slides are named by the writer, since python-pptx reuses the
+names of the parts of released slides. Parts without relationships, like
+pictures, are written once however many slides show them.
+
+Slides can also be added to a copy of an existing package, whose parts are
+copied to the new archive without being parsed, except for the few parts
+listing the slides.
+
+Both writers write to a path or to any writable binary stream, even one that
+can not seek, part by part. Parts compressed by their own format (pictures,
+videos, workbooks) can be stored as is, since deflating them costs time for
+no gain, and XML parts are deflated at the given level.
+"""
+import hashlib
+import os
+import re
+import shutil
+import zipfile
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.constants import RELATIONSHIP_TARGET_MODE as RTM
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import CT_Relationships, CT_Types
+from pptx.opc.oxml import parse_xml as parse_opc_xml
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI, PackURI
+from pptx.opc.spec import default_content_types
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn
+
+from .profiling import add_bytes
+
+# Number in the names of parts, like the 3 of /ppt/slides/slide3.xml
+_PARTNAME_NUMBER = re.compile(r"\d*(?=\.\w+$)")
+
+# Parts compressed by their own format, which deflating does not shrink
+_COMPRESSED_CONTENT_TYPES = {CT.GIF, CT.JPEG, CT.PNG, CT.SML_SHEET}
+_COMPRESSED_CONTENT_TYPE_PREFIXES = ("audio/", "video/")
+
+_EMU_PER_INCH = 914400
+_DEFAULT_SLIDE_SIZE = (9144000, 6858000)
+# Difference of slide sizes ignored when adding slides to an existing package,
+# like 13.33 inches against the 13.333 inches of widescreen slides
+_SLIDE_SIZE_TOLERANCE = _EMU_PER_INCH // 100
+
+
+# Namespace of the sections of presentations, an extension of PowerPoint 2010
+_P14 = "{http://schemas.microsoft.com/office/powerpoint/2010/main}"
+
+
+def _update_sections(
+    presentation: Any, before: Any, removed_ids: Set[int], new_ids: List[int]
+) -> None:
+    """
+    Remove the slides `removed_ids` from the sections of a presentation
+    element, and add the slides `new_ids` to a section before the slide
+    `before`, or at the end of the last section when `before` is None.
+    """
+    entries = {
+        int(entry.get("id")): entry for entry in presentation.iter(f"{_P14}sldId")
+    }
+    sections = list(presentation.iter(f"{_P14}sldIdLst"))
+    if not sections:
+        return
+    anchor = entries.get(before.id) if before is not None else None
+    for id in new_ids:
+        entry = sections[-1].makeelement(f"{_P14}sldId", id=str(id))
+        if anchor is None:
+            sections[-1].append(entry)
+        else:
+            anchor.addprevious(entry)
+    for id in removed_ids:
+        if id in entries:
+            entries[id].getparent().remove(entries[id])
+
+
+def _update_custom_shows(
+    presentation: Any, before: Any, removed_rIds: Set[str], new_rIds: List[str]
+) -> None:
+    """
+    Remove the slides `removed_rIds` from the custom shows of a presentation
+    element. The slides `new_rIds` take the place of the slide `before` in
+    the custom shows showing it.
+    """
+    for sld in list(presentation.iter(qn("p:sld"))):
+        rId = sld.get(qn("r:id"))
+        if before is not None and rId == before.rId:
+            for new_rId in new_rIds:
+                sld.addprevious(sld.makeelement(qn("p:sld"), {qn("r:id"): new_rId}))
+        if rId in removed_rIds:
+            sld.getparent().remove(sld)
+
+
+def _slide_size(presentation: Any) -> Tuple[int, int]:
+    # Slide size of a presentation element in EMU, 10 x 7.5 inches by default
+    sldSz = presentation.find(qn("p:sldSz"))
+    if sldSz is None:
+        return _DEFAULT_SLIDE_SIZE
+    return int(sldSz.get("cx")), int(sldSz.get("cy"))
+
+
+class _Archive:
+    """
+    ZIP archive of a package, compressing each member according to the
+    content type of its part.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        store_compressed_media: bool,
+        compression_level: int,
+    ):
+        self._zip = zipfile.ZipFile(
+            file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level
+        )
+        # Path of the archive, removed when writing fails
+        self._path = file if isinstance(file, (str, os.PathLike)) else None
+        self._store_compressed_media = store_compressed_media
+        self._compression_level = compression_level
+
+    def _is_compressed(self, content_type: str) -> bool:
+        return content_type in _COMPRESSED_CONTENT_TYPES or content_type.startswith(
+            _COMPRESSED_CONTENT_TYPE_PREFIXES
+        )
+
+    def write(self, membername: str, blob: bytes, content_type: str = CT.XML) -> None:
+        if self._store_compressed_media and self._is_compressed(content_type):
+            self._zip.writestr(membername, blob, compress_type=zipfile.ZIP_STORED)
+        else:
+            self._zip.writestr(membername, blob, compresslevel=self._compression_level)
+        add_bytes(len(blob))
+
+    def copy(self, source: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        """
+        Copy a member of another archive, a chunk at a time. Stored members,
+        like pictures and videos, are stored again as they are, and the other
+        members are decompressed and deflated again at the compression level
+        of the archive.
+        """
+        if info.compress_type == zipfile.ZIP_STORED:
+            target = zipfile.ZipInfo(info.filename, info.date_time)
+        else:
+            target = info.filename
+        force_zip64 = info.file_size >= zipfile.ZIP64_LIMIT
+        with source.open(info) as member, self._zip.open(
+            target, "w", force_zip64=force_zip64
+        ) as copied:
+            shutil.copyfileobj(member, copied)
+        add_bytes(info.file_size)
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def abort(self) -> None:
+        """
+        Close the archive and remove its file. Streams keep the members
+        written so far, which do not form a package.
+        """
+        self._zip.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+
+
+def write_package(
+    file: Union[str, os.PathLike, BinaryIO],
+    package: Any,
+    store_compressed_media: bool = True,
+    compression_level: int = 6,
+) -> None:
+    """
+    Write a package like python-pptx does, with the content types first, then
+    the package relationships, and each part followed by its relationships.
+    """
+    archive = _Archive(file, store_compressed_media, compression_level)
+    parts = list(package.iter_parts())
+    archive.write(
+        CONTENT_TYPES_URI.membername,
+        _content_types_xml((part.partname, part.content_type) for part in parts),
+    )
+    archive.write(PACKAGE_URI.rels_uri.membername, package._rels.xml)
+    for part in parts:
+        archive.write(part.partname.membername, part.blob, part.content_type)
+        if len(part.rels):
+            archive.write(part.partname.rels_uri.membername, part.rels.xml)
+    archive.close()
+
+
+def _content_types_xml(content_types: Iterable[Tuple[PackURI, str]]) -> bytes:
+    # Same mapping as python-pptx: parts with a known extension and content
+    # type are covered by a default, the others are overridden one by one.
+    defaults = {"rels": CT.OPC_RELATIONSHIPS, "xml": CT.XML}
+    overrides = {}
+    for partname, content_type in content_types:
+        if (partname.ext.lower(), content_type) in default_content_types:
+            defaults[partname.ext.lower()] = content_type
+        else:
+            overrides[partname] = content_type
+
+    types_element = CT_Types.new()
+    for ext, content_type in sorted(defaults.items()):
+        types_element.add_default(ext, content_type)
+    for partname, content_type in sorted(overrides.items()):
+        types_element.add_override(partname, content_type)
+    return serialize_part_xml(types_element)
+
+
+class StreamingPackageWriter:
+    """
+    Writes a package whose slides are added one at a time. The package must
+    have no slides when the writer is created, so that all its parts are the
+    ones shared by the slides.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        package: Any,
+        store_compressed_media: bool = True,
+        compression_level: int = 6,
+    ):
+        self._archive = _Archive(file, store_compressed_media, compression_level)
+        self._package = package
+        self._shared_parts = list(package.iter_parts())
+        self._shared_part_set = set(self._shared_parts)
+
+        # partname -> content type of the written parts
+        self._content_types: Dict[PackURI, str] = {}
+        # name template, like /ppt/slides/slide%d.xml -> last number used
+        self._last_numbers: Dict[str, int] = {}
+        # content type and hash of a part without relationships -> partname
+        self._written_blobs: Dict[Tuple[str, str], PackURI] = {}
+        # partnames of the written slides, in order
+        self._slide_partnames: List[PackURI] = []
+
+    def _next_partname(self, partname: PackURI) -> PackURI:
+        template = _PARTNAME_NUMBER.sub("%d", partname, count=1)
+        number = self._last_numbers.get(template, 0) + 1
+        self._last_numbers[template] = number
+        return PackURI(template % number)
+
+    def _write(self, partname: PackURI, content_type: str, blob: bytes) -> None:
+        self._archive.write(partname.membername, blob, content_type)
+        self._content_types[partname] = content_type
+
+    def _rels_element(self, source_uri: PackURI, rels: Any, names: Dict) -> Any:
+        """
+        Return the relationships of a part (or of the package), where `names`
+        gives the partname written for each target part.
+        """
+        rels_element = CT_Relationships.new()
+        for rel in rels:
+            if rel.is_external:
+                target_ref = rel.target_ref
+            else:
+                target_ref = names[rel.target_part].relative_ref(source_uri.baseURI)
+            rels_element.add_rel(rel.rId, rel.reltype, target_ref, rel.is_external)
+        return rels_element
+
+    def _write_rels(self, source_uri: PackURI, rels_element: Any) -> None:
+        if len(rels_element):
+            self._archive.write(source_uri.rels_uri.membername, rels_element.xml)
+
+    def _write_part(self, part: Any, names: Dict[Any, PackURI]) -> PackURI:
+        """
+        Write a part owned by a slide and the parts it relates to, unless they
+        were already written. Return the partname it was written as.
+        """
+        if part in names:
+            return names[part]
+        if part in self._shared_part_set:
+            names[part] = self._shared_partname(part)
+            return names[part]
+
+        blob = part.blob
+        if not len(part.rels):
+            blob_key = (part.content_type, hashlib.sha1(blob).hexdigest())
+            if blob_key not in self._written_blobs:
+                partname = self._next_partname(part.partname)
+                self._write(partname, part.content_type, blob)
+                self._written_blobs[blob_key] = partname
+            names[part] = self._written_blobs[blob_key]
+            return names[part]
+
+        names[part] = partname = self._next_partname(part.partname)
+        for rel in part.rels:
+            if not rel.is_external:
+                self._write_part(rel.target_part, names)
+        self._write(partname, part.content_type, blob)
+        self._write_rels(partname, self._rels_element(partname, part.rels, names))
+        return partname
+
+    def _shared_partname(self, part: Any) -> PackURI:
+        # Partname of a shared part related to by a slide
+        return part.partname
+
+    def write_slide(self, slide_part: Any) -> None:
+        """
+        Write a slide and the parts it owns. The slide can be released once
+        written.
+        """
+        partname = self._write_part(slide_part, {})
+        self._slide_partnames.append(partname)
+
+    def abort(self) -> None:
+        """
+        Stop writing after a failure: the archive is closed and its file
+        removed, so that no truncated package is left behind. Streams are left
+        with the parts written so far, which do not form a package.
+        """
+        self._archive.abort()
+
+    def close(self) -> None:
+        """
+        Write the presentation part listing the written slides, the shared
+        parts and the content types, then close the archive.
+        """
+        presentation_part = self._package.main_document_part
+        names = {part: part.partname for part in self._shared_parts}
+
+        # The presentation part relates to the slides with ids following its
+        # own relationships.
+        presentation_rels = self._rels_element(
+            presentation_part.partname, presentation_part.rels, names
+        )
+        rIds = {rel.rId for rel in presentation_part.rels}
+        sldIdLst = presentation_part._element.get_or_add_sldIdLst()
+        for sldId in list(sldIdLst):
+            sldIdLst.remove(sldId)
+        number = 0
+        for index, slide_partname in enumerate(self._slide_partnames):
+            number += 1
+            while f"rId{number}" in rIds:
+                number += 1
+            sldIdLst._add_sldId(id=256 + index, rId=f"rId{number}")
+            presentation_rels.add_rel(
+                f"rId{number}",
+                RT.SLIDE,
+                slide_partname.relative_ref(presentation_part.partname.baseURI),
+            )
+
+        for part in self._shared_parts:
+            self._write(part.partname, part.content_type, part.blob)
+            if part is presentation_part:
+                self._write_rels(part.partname, presentation_rels)
+            else:
+                rels_element = self._rels_element(part.partname, part.rels, names)
+                self._write_rels(part.partname, rels_element)
+        package_rels = self._rels_element(PACKAGE_URI, self._package._rels, names)
+        self._write_rels(PACKAGE_URI, package_rels)
+
+        self._archive.write(
+            CONTENT_TYPES_URI.membername,
+            _content_types_xml(self._content_types.items()),
+        )
+        self._archive.close()
+
+
+class PackageUpdateWriter(StreamingPackageWriter):
+    """
+    Writes a copy of an existing package `base` with the slides added one at a
+    time. The added slides take the place of the slides of `base` at the
+    indices `replace`, which are removed, or follow its last slide. They use
+    the blank layout of `base`.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        package: Any,
+        base: Union[str, os.PathLike, BinaryIO],
+        replace: Sequence[int] = (),
+        store_compressed_media: bool = True,
+        compression_level: int = 6,
+    ):
+        super().__init__(file, package, store_compressed_media, compression_level)
+        try:
+            self._base = zipfile.ZipFile(base)
+            self._read_base(replace)
+        except BaseException:
+            self._archive.abort()
+            raise
+
+    def _read_base(self, replace: Sequence[int]) -> None:
+        self._base_partnames = {
+            PackURI(f"/{name}") for name in self._base.namelist() if name[-1] != "/"
+        }
+        # Numbering continues after the parts of the existing package
+        for partname in self._base_partnames:
+            template = _PARTNAME_NUMBER.sub("%d", partname, count=1)
+            number = int(_PARTNAME_NUMBER.search(partname).group() or 0)
+            if number > self._last_numbers.get(template, 0):
+                self._last_numbers[template] = number
+
+        self._package_rels = self._read_rels(PACKAGE_URI)
+        (self._presentation_partname,) = [
+            self._target_partname(PACKAGE_URI, rel)
+            for rel in self._package_rels
+            if rel.reltype == RT.OFFICE_DOCUMENT
+        ]
+        self._presentation_rels = self._read_rels(self._presentation_partname)
+
+        self._check_slide_size()
+        n_slides = len(self._sldIdLst())
+        for index in replace:
+            if not 0 <= index < n_slides:
+                raise ValueError(
+                    f"Cannot replace slide {index} of a presentation of "
+                    f"{n_slides} slides"
+                )
+        self._replace = sorted(set(replace))
+        self._layout_partname = self._blank_layout_partname()
+
+    def _check_slide_size(self) -> None:
+        # Slides are laid out for the size of the presentation, which has to
+        # be the size of the slides of the existing package
+        base_presentation = parse_xml(
+            self._base.read(self._presentation_partname.membername)
+        )
+        size = _slide_size(self._package.main_document_part._element)
+        base_size = _slide_size(base_presentation)
+        if any(abs(a - b) > _SLIDE_SIZE_TOLERANCE for a, b in zip(size, base_size)):
+            raise ValueError(
+                f"Slides of {size[0] / _EMU_PER_INCH:g} x "
+                f"{size[1] / _EMU_PER_INCH:g} inches can not be added to a "
+                f"presentation of {base_size[0] / _EMU_PER_INCH:g} x "
+                f"{base_size[1] / _EMU_PER_INCH:g} inches"
+                + "\nCreate the presentation with the slide size of the existing one"
+            )
+
+    def _read_rels(self, source_uri: PackURI) -> List[Any]:
+        membername = source_uri.rels_uri.membername
+        if PackURI(f"/{membername}") not in self._base_partnames:
+            return []
+        return list(parse_opc_xml(self._base.read(membername)))
+
+    def _target_partname(self, source_uri: PackURI, rel: Any) -> PackURI:
+        return PackURI.from_rel_ref(source_uri.baseURI, rel.target_ref)
+
+    def _sldIdLst(self) -> Any:
+        presentation = parse_xml(
+            self._base.read(self._presentation_partname.membername)
+        )
+        return presentation.get_or_add_sldIdLst()
+
+    def _blank_layout_partname(self) -> PackURI:
+        """
+        Return the layout named "Blank", or else the layout with the fewest
+        placeholders, of the first slide master of the existing package.
+        """
+        (master_partname,) = [
+            self._target_partname(self._presentation_partname, rel)
+            for rel in self._presentation_rels
+            if rel.reltype == RT.SLIDE_MASTER
+        ][:1]
+        layouts = []
+        for rel in self._read_rels(master_partname):
+            if rel.reltype != RT.SLIDE_LAYOUT:
+                continue
+            partname = self._target_partname(master_partname, rel)
+            layout = parse_xml(self._base.read(partname.membername))
+            if layout.find(qn("p:cSld")).get("name") == "Blank":
+                return partname
+            layouts.append((len(layout.findall(f".//{qn('p:ph')}")), partname))
+        return min(layouts, key=lambda layout: layout[0])[1]
+
+    def _shared_partname(self, part: Any) -> PackURI:
+        if part.content_type == CT.PML_SLIDE_LAYOUT:
+            return self._layout_partname
+        return super()._shared_partname(part)
+
+    def _reachable_partnames(self, presentation_rels: List[Any]) -> Set[PackURI]:
+        # Parts reachable from the package relationships, where the
+        # presentation part has the given relationships
+        reachable = set()
+        pending = [PACKAGE_URI]
+        while pending:
+            source_uri = pending.pop()
+            if source_uri == self._presentation_partname:
+                rels = presentation_rels
+            else:
+                rels = self._read_rels(source_uri)
+            for rel in rels:
+                if rel.targetMode == RTM.EXTERNAL:
+                    continue
+                partname = self._target_partname(source_uri, rel)
+                if partname not in reachable:
+                    reachable.add(partname)
+                    pending.append(partname)
+        return reachable
+
+    def close(self) -> None:
+        """
+        Write the presentation part listing the slides of the existing package
+        and the written slides, in its slide list, sections and custom shows,
+        copy the other parts of the existing package, write the content types,
+        then close the archive.
+        """
+        presentation = parse_xml(
+            self._base.read(self._presentation_partname.membername)
+        )
+        sldIdLst = presentation.get_or_add_sldIdLst()
+        sldIds = list(sldIdLst)
+        removed_rIds = {sldIds[index].rId for index in self._replace}
+        kept_rels = [
+            rel for rel in self._presentation_rels if rel.rId not in removed_rIds
+        ]
+
+        # Parts only reachable through the removed slides are removed with them
+        removed_partnames: Set[PackURI] = set()
+        if removed_rIds:
+            removed_partnames = self._reachable_partnames(
+                self._presentation_rels
+            ) - self._reachable_partnames(kept_rels)
+
+        presentation_rels = CT_Relationships.new()
+        rIds = set()
+        for rel in kept_rels:
+            presentation_rels.append(rel)
+            rIds.add(rel.rId)
+
+        # The written slides take the place of the first removed slide
+        position = self._replace[0] if self._replace else len(sldIds)
+        next_id = max([255] + [sldId.id for sldId in sldIds]) + 1
+        new_sldIds = []
+        number = 0
+        for index, slide_partname in enumerate(self._slide_partnames):
+            number += 1
+            while f"rId{number}" in rIds:
+                number += 1
+            new_sldIds.append((next_id + index, f"rId{number}"))
+            presentation_rels.add_rel(
+                f"rId{number}",
+                RT.SLIDE,
+                slide_partname.relative_ref(self._presentation_partname.baseURI),
+            )
+        for sldId in sldIds:
+            sldIdLst.remove(sldId)
+        for index, sldId in enumerate(sldIds):
+            if index == position:
+                for id, rId in new_sldIds:
+                    sldIdLst._add_sldId(id=id, rId=rId)
+            if sldId.rId not in removed_rIds:
+                sldIdLst.append(sldId)
+        if position == len(sldIds):
+            for id, rId in new_sldIds:
+                sldIdLst._add_sldId(id=id, rId=rId)
+        # Sections and custom shows list the slides too
+        before = sldIds[position] if position < len(sldIds) else None
+        _update_sections(
+            presentation,
+            before,
+            {sldId.id for sldId in sldIds if sldId.rId in removed_rIds},
+            [id for id, _ in new_sldIds],
+        )
+        _update_custom_shows(
+            presentation, before, removed_rIds, [rId for _, rId in new_sldIds]
+        )
+
+        # Rewritten or removed parts, and the relationships of the removed parts
+        skipped_membernames = {
+            CONTENT_TYPES_URI.membername,
+            self._presentation_partname.membername,
+            self._presentation_partname.rels_uri.membername,
+        }
+        for partname in removed_partnames:
+            skipped_membernames.add(partname.membername)
+            skipped_membernames.add(partname.rels_uri.membername)
+        for info in self._base.infolist():
+            if info.filename not in skipped_membernames and not info.is_dir():
+                self._archive.copy(self._base, info)
+
+        self._archive.write(
+            self._presentation_partname.membername,
+            serialize_part_xml(presentation),
+        )
+        self._archive.write(
+            self._presentation_partname.rels_uri.membername, presentation_rels.xml
+        )
+        self._archive.write(
+            CONTENT_TYPES_URI.membername,
+            self._updated_content_types_xml(removed_partnames),
+        )
+        self._archive.close()
+        self._base.close()
+
+    def abort(self) -> None:
+        super().abort()
+        self._base.close()
+
+    def _updated_content_types_xml(self, removed_partnames: Set[PackURI]) -> bytes:
+        types_element = parse_opc_xml(self._base.read(CONTENT_TYPES_URI.membername))
+        for override in list(types_element.override_lst):
+            if PackURI(override.partName) in removed_partnames:
+                types_element.remove(override)
+
+        defaults = {
+            default.extension.lower(): default.contentType
+            for default in types_element.default_lst
+        }
+        for partname, content_type in self._content_types.items():
+            ext = partname.ext.lower()
+            if defaults.get(ext) == content_type:
+                continue
+            if ext not in defaults and (ext, content_type) in default_content_types:
+                types_element.add_default(ext, content_type)
+                defaults[ext] = content_type
+            else:
+                types_element.add_override(partname, content_type)
+        return serialize_part_xml(types_element)
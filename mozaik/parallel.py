@@ -0,0 +1,184 @@
+"""
+Compilation of slides in worker processes.
+
+Once the geometry is calculated and the pictures and figures are prepared,
+slides are independent. Chunks of consecutive slides are built by workers, each
+in its own PowerPoint presentation, and exported as slide XML along with the
+pictures and hyperlinks it relates to. The main process adds them to the
+presentation in the order of the slides, relating the pictures in the same
+order as a serial compilation would, so that the output is the same.
+
+Slides relating to other parts (like charts, which own their workbook) can
+not be exported, and slides whose content can not be pickled (like tables read
+from generators) can not be sent, so they are built by the main process.
+"""
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from .slide import Slide
+
+# Relationship of an exported slide: rId, type, whether it is external, and
+# the URL or the picture it targets
+ExportedRelationship = Tuple[str, str, bool, Any]
+# Slide XML and its relationships
+ExportedSlide = Tuple[bytes, List[ExportedRelationship]]
+# Key of a rect in a chunk: index of its slide and its char
+RectKey = Tuple[int, str]
+
+# Number of chunks submitted to each worker ahead of the slides being added
+_CHUNKS_PER_WORKER = 2
+
+
+class _PreparedBlobs:
+    # Stands for the picture and figure caches of the main process
+    def __init__(self, blobs: Dict[Any, bytes]):
+        self._blobs = blobs
+
+    def get(self, key: Any) -> BytesIO:
+        return BytesIO(self._blobs[key])
+
+
+def _export_slide(slide_part: Any) -> Optional[ExportedSlide]:
+    """
+    Export a slide built by a worker, or return None when it relates to parts
+    other than pictures.
+    """
+    relationships = []
+    # In the order they were added, rId10 following rId9
+    for rel in sorted(slide_part.rels, key=lambda rel: (len(rel.rId), rel.rId)):
+        if rel.reltype == RT.SLIDE_LAYOUT:
+            continue
+        if rel.is_external:
+            relationships.append((rel.rId, rel.reltype, True, rel.target_ref))
+        elif rel.reltype == RT.IMAGE:
+            relationships.append((rel.rId, rel.reltype, False, rel.target_part.blob))
+        else:
+            return None
+    return slide_part.blob, relationships
+
+
+def build_slides(
+    presentation_size: Tuple[float, float],
+    config: Dict[str, Any],
+    pickled_slides: List[Optional[bytes]],
+    picture_variants: Dict[RectKey, Any],
+    figure_keys: Dict[RectKey, str],
+    blobs: Dict[Any, bytes],
+) -> List[Optional[List[ExportedSlide]]]:
+    """
+    Build a chunk of pickled slides and export their PPT slides, or None for
+    the slides which could not be pickled. This runs in the worker processes.
+    """
+    from . import presentation as presentation_module
+
+    slides = [blob and pickle.loads(blob) for blob in pickled_slides]
+    presentation_module.config.update(config)
+    presentation = presentation_module.Presentation(*presentation_size)
+    presentation._reset_compilation()
+    presentation.picture_cache = presentation.figure_cache = _PreparedBlobs(blobs)
+    for (index, char), key in picture_variants.items():
+        presentation._picture_variants[slides[index].rects[char]] = key
+    for (index, char), key in figure_keys.items():
+        presentation._figure_keys[slides[index].rects[char]] = key
+
+    sldIdLst = presentation.prs.slides._sldIdLst
+    exported_slides = []
+    for slide in slides:
+        if slide is None:
+            exported_slides.append(None)
+            continue
+        presentation._build_slide(slide)
+        pages = []
+        for sldId in sldIdLst:
+            page = _export_slide(presentation.prs.part.related_part(sldId.rId))
+            if page is None:
+                pages = None
+                break
+            pages.append(page)
+        exported_slides.append(pages)
+        # The presentation is kept small, python-pptx walks all its parts
+        # whenever a part is added.
+        presentation._remove_slides([sldId.id for sldId in sldIdLst])
+    return exported_slides
+
+
+def _chunk_arguments(
+    presentation: Any, config: Dict[str, Any], slides: List[Slide]
+) -> Tuple:
+    """
+    Return the arguments of `build_slides` for a chunk of slides. The slides
+    are sent without their picture sources and figure callables, which are
+    already prepared and may not be picklable. Slides whose other content can
+    not be pickled are sent as None.
+    """
+    sent_slides = []
+    picture_variants = {}
+    figure_keys = {}
+    blobs = {}
+    for index, slide in enumerate(slides):
+        sent_slide = copy(slide)
+        # Templates only identify the slides stamped from the same shapes
+        if slide.template is not None:
+            sent_slide.template = id(slide.template)
+        sent_slide.rects = {}
+        for char, rect in slide.rects.items():
+            sent_rect = sent_slide.rects[char] = copy(rect)
+            sent_rect.content = dict(rect.content)
+            if rect in presentation._picture_variants:
+                key = presentation._picture_variants[rect]
+                picture_variants[index, char] = key
+                blobs[key] = presentation.picture_cache.get(key).getvalue()
+                sent_rect.content["picture_source"] = None
+            if rect in presentation._figure_keys:
+                key = presentation._figure_keys[rect]
+                figure_keys[index, char] = key
+                blobs[key] = presentation.figure_cache.get(key).getvalue()
+                sent_rect.content["figure"] = None
+        try:
+            sent_slides.append(pickle.dumps(sent_slide, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            # Like tables read from generators, or custom objects
+            sent_slides.append(None)
+
+    presentation_size = (
+        presentation.presentation_width,
+        presentation.presentation_height,
+    )
+    return presentation_size, config, sent_slides, picture_variants, figure_keys, blobs
+
+
+def iter_built_slides(
+    presentation: Any,
+    config: Dict[str, Any],
+    slides: List[Slide],
+    workers: Optional[int],
+) -> Iterator[Tuple[Slide, Optional[List[ExportedSlide]]]]:
+    """
+    Build `slides` in a process pool, and yield each slide in order with its
+    exported PPT slides, or None when it must be built by the main process.
+    Only a few chunks are in flight at once, so that exported slides do not
+    pile up while they are being added.
+    """
+    n_workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, min(64, len(slides) // (n_workers * 4)))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for start in range(0, len(slides), chunk_size):
+            chunk = slides[start : start + chunk_size]
+            arguments = _chunk_arguments(presentation, config, chunk)
+            pending.append((chunk, executor.submit(build_slides, *arguments)))
+            if len(pending) >= n_workers * _CHUNKS_PER_WORKER:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, future.result())
+
+        while pending:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
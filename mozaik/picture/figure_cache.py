@@ -0,0 +1,199 @@
+"""
+Rendering stage of the figures of the compilation.
+
+Figures are given as a callable returning a matplotlib figure, along with its
+arguments. They are rendered at the size of their rect, so that they are
+embedded without resampling. Rendered figures are stored on disk, keyed by a
+hash of the callable, its arguments, the size and the DPI, so that only the
+figures which changed are rendered again across runs.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+# A figure: the callable, its positional and keyword arguments
+FigureSpec = Tuple[Callable[..., Any], Tuple[Any, ...], Dict[str, Any]]
+
+
+def _code_fingerprint(code: types.CodeType) -> bytes:
+    parts = [code.co_code, repr(code.co_names).encode()]
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            parts.append(_code_fingerprint(const))
+        else:
+            parts.append(repr(const).encode())
+    return b"\0".join(parts)
+
+
+def _callable_fingerprint(func: Callable[..., Any]) -> bytes:
+    """
+    Identify a callable by its name and, for functions, by its code, the
+    values it closes over and the object it is bound to, so that editing a
+    function or its data invalidates its figures. The functions it calls and
+    the globals it reads are not inspected. Raise an exception when the
+    values or the object can not be pickled.
+    """
+    name = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', '')}"
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return name.encode() + pickle.dumps(func, protocol=4)
+    defaults = repr((func.__defaults__, func.__kwdefaults__)).encode()
+    # Closures and bound methods differ by their data, not by their code
+    closure = [cell.cell_contents for cell in func.__closure__ or ()]
+    bound = func.__self__ if isinstance(func, types.MethodType) else None
+    data = pickle.dumps((closure, bound), protocol=4)
+    return name.encode() + _code_fingerprint(code) + defaults + data
+
+
+def figure_key(
+    spec: FigureSpec, width_inch: float, height_inch: float, dpi: Optional[float]
+) -> Optional[str]:
+    """
+    Return the hash identifying the rendering of a figure, or None when the
+    figure can not be identified, like closures over values which can not be
+    pickled.
+    """
+    func, args, kwargs = spec
+    try:
+        digest = hashlib.sha1(_callable_fingerprint(func))
+        digest.update(pickle.dumps((args, sorted(kwargs.items())), protocol=4))
+    except Exception:
+        return None
+    digest.update(repr((round(width_inch, 6), round(height_inch, 6), dpi)).encode())
+    return digest.hexdigest()
+
+
+def render_figure(
+    spec: FigureSpec, width_inch: float, height_inch: float, dpi: Optional[float]
+) -> bytes:
+    """
+    Render a figure as PNG at the given size. This runs in the worker
+    processes of the rendering stage.
+    """
+    import matplotlib.pyplot as plt
+
+    func, args, kwargs = spec
+    figure = func(*args, **kwargs)
+    try:
+        figure.set_size_inches(width_inch, height_inch)
+        output = BytesIO()
+        figure.savefig(output, format="png", dpi=dpi or "figure")
+    finally:
+        plt.close(figure)
+    return output.getvalue()
+
+
+def default_cache_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "mozaik", "figures")
+
+
+class FigureCache:
+    """
+    Store of the figures rendered for a presentation, backed by a directory
+    shared between runs.
+
+    Placements are registered with `register`, then `render` renders the
+    figures missing from the cache. `get` returns the rendered figure.
+    """
+
+    def __init__(self, directory: Optional[str], dpi: Optional[float] = 220):
+        # None keeps the rendered figures in memory only
+        self.directory = directory
+        self.dpi = dpi
+
+        # key -> PNG bytes
+        self._rendered: Dict[str, bytes] = {}
+        # key -> figure and size, waiting to be rendered
+        self._pending: Dict[str, Tuple[FigureSpec, float, float]] = {}
+        # Keys of the figures which could not be identified, rendered for a
+        # single placement and never stored on disk
+        self._uncached: Set[str] = set()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def register(self, spec: FigureSpec, width_inch: float, height_inch: float) -> str:
+        """
+        Register a placement of a figure in a box of the given size. Return
+        the key of the figure to `get` once rendered.
+        """
+        key = figure_key(spec, width_inch, height_inch, self.dpi)
+        if key is None:
+            key = f"uncached-{len(self._uncached)}"
+            self._uncached.add(key)
+            self._pending[key] = (spec, width_inch, height_inch)
+            return key
+        if key in self._rendered or key in self._pending:
+            return key
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as file:
+                self._rendered[key] = file.read()
+        else:
+            self._pending[key] = (spec, width_inch, height_inch)
+        return key
+
+    def _store(self, key: str, blob: bytes) -> None:
+        self._rendered[key] = blob
+        if self.directory is None or key in self._uncached:
+            return
+        # Written under a temporary name, so that concurrent runs never read
+        # a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(blob)
+        os.replace(temporary_path, self._path(key))
+
+    def render(self, workers: Optional[int] = None) -> int:
+        """
+        Render the registered figures missing from the cache, and return their
+        number. With more than one worker, figures are rendered in a process
+        pool, except the figures whose callable or arguments can not be
+        pickled. `None` uses as many workers as there are CPUs.
+        """
+        pending = self._pending
+        self._pending = {}
+
+        if workers == 1 or len(pending) < 2:
+            for key, (spec, width_inch, height_inch) in pending.items():
+                self._store(key, render_figure(spec, width_inch, height_inch, self.dpi))
+            return len(pending)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for key, (spec, width, height) in pending.items():
+                try:
+                    pickle.dumps(spec, protocol=4)
+                except Exception:
+                    # Like lambdas, which are rendered by this process
+                    self._store(key, render_figure(spec, width, height, self.dpi))
+                    continue
+                futures[key] = executor.submit(
+                    render_figure, spec, width, height, self.dpi
+                )
+            for key, future in futures.items():
+                self._store(key, future.result())
+        return len(pending)
+
+    def get(self, key: str) -> BytesIO:
+        """
+        Return a rendered figure as a file-like object.
+        """
+        return BytesIO(self._rendered[key])
+
+    def release(self, keys: Iterable[str]) -> None:
+        """
+        Forget the figures `keys` once embedded. Figures registered again are
+        read from the cache directory, or rendered again.
+        """
+        for key in set(keys):
+            self._rendered.pop(key, None)
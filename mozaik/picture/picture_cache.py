@@ -0,0 +1,334 @@
+"""
+Image preparation stage of the compilation.
+
+Every picture placement is registered before any shape is built. Sources, be
+they paths or in-memory pictures, are identified by the hash of their bytes,
+so each distinct image is embedded only once, and it is resampled to the
+target DPI of its largest placement. Pictures in cover mode are cropped to
+their visible region before being embedded.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+from .picture_modes import calculate_cover_crop_box
+from .picture_source import PictureSource, read_picture_source, source_path
+
+# Formats of the animated pictures, which keep their frames when cropped
+_ANIMATED_FORMATS = ("GIF", "PNG", "WEBP")
+
+# Identifies a picture to embed: digest of the source and optional crop box
+VariantKey = Tuple[str, Optional[Tuple[int, int, int, int]]]
+
+
+def _display_scale(
+    size_mode: str,
+    image_size: Tuple[int, int],
+    width_inch: float,
+    height_inch: float,
+) -> float:
+    """
+    Return the displayed size of one source pixel (in inches) for a placement.
+    This follows the sizing rules of `Presentation.compile_picture`.
+    """
+    image_width, image_height = image_size
+    width_scale = width_inch / image_width
+    height_scale = height_inch / image_height
+
+    if size_mode == "fit":
+        # Only one side of the bounding box is given to python-pptx, the other
+        # side is scaled proportionally.
+        if width_inch < height_inch:
+            return height_scale
+        if width_inch > height_inch:
+            return width_scale
+        return max(width_scale, height_scale)
+
+    # Both stretch and cover show the picture at least as large as the bounding
+    # box on both axes, so the larger scale decides the needed resolution.
+    return max(width_scale, height_scale)
+
+
+def _crop_frames(image: Image.Image, crop_box: Tuple[int, int, int, int]) -> bytes:
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get("duration", 100))
+        frames.append(frame.convert("RGBA").crop(crop_box))
+    output = BytesIO()
+    frames[0].save(
+        output,
+        format=image.format,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=image.info.get("loop", 0),
+        # Frames are whole, each one replaces the previous one
+        disposal=2,
+    )
+    return output.getvalue()
+
+
+def prepare_picture(
+    blob: bytes,
+    crop_box: Optional[Tuple[int, int, int, int]],
+    factor: float,
+    jpeg_quality: int,
+) -> bytes:
+    """
+    Crop the picture in `blob` to `crop_box` and resample it by `factor`.
+    This runs in the worker processes of the image preparation stage.
+    """
+    with Image.open(BytesIO(blob)) as image:
+        image_format = image.format
+        if getattr(image, "n_frames", 1) > 1:
+            # Resampling animated pictures would lose their frames, so they are
+            # only cropped, frame by frame
+            if crop_box is None:
+                return blob
+            if image_format in _ANIMATED_FORMATS:
+                return _crop_frames(image, crop_box)
+        # Only the pixels of the visible region are decoded and resampled
+        region = crop_box or (0, 0, image.width, image.height)
+        target_size = (
+            max(1, round((region[2] - region[0]) * factor)),
+            max(1, round((region[3] - region[1]) * factor)),
+        )
+        if target_size == (region[2] - region[0], region[3] - region[1]):
+            resampled = image.crop(region)
+        else:
+            resampled = image.resize(target_size, Image.LANCZOS, box=region)
+
+    output = BytesIO()
+    if image_format == "JPEG":
+        resampled.save(output, format="JPEG", quality=jpeg_quality)
+    else:
+        resampled.save(output, format="PNG")
+
+    # Keep the original when re-encoding does not pay off. Cropped pictures
+    # always use the re-encoded region, the original would not fit.
+    if crop_box is None and output.tell() >= len(blob):
+        return blob
+    return output.getvalue()
+
+
+class SharedPictures:
+    """
+    Pictures read and prepared for several presentations, like the logos and
+    backgrounds shown by a batch of decks, so that each is only read, decoded
+    and resampled once. Everything is dropped once the pictures held exceed
+    `max_bytes`, when trimmed between presentations.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self) -> None:
+        # Same contents as the stores of `PictureCache`
+        self.digests: Dict[Tuple[str, int, int], str] = {}
+        self.sources: Dict[str, bytes] = {}
+        self.image_sizes: Dict[str, Tuple[int, int]] = {}
+        # digest, crop box, factor and JPEG quality -> prepared bytes
+        self.prepared: Dict[Tuple, bytes] = {}
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(map(len, self.sources.values())) + sum(
+            map(len, self.prepared.values())
+        )
+
+    def trim(self) -> None:
+        if self.n_bytes > self.max_bytes:
+            self.clear()
+
+
+class PictureCache:
+    """
+    Content-addressed store of the pictures embedded in a presentation.
+
+    Placements are registered with `register`, then `prepare` crops and
+    resamples each distinct image once. `get` returns the prepared bytes of
+    the variant of a placement.
+
+    With `shared`, the sources and the prepared pictures are shared with other
+    presentations.
+    """
+
+    def __init__(
+        self,
+        target_dpi: Optional[float] = 220,
+        jpeg_quality: int = 90,
+        shared: Optional[SharedPictures] = None,
+    ):
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+        # Pictures of other presentations are kept when releasing variants
+        self._owns_shared = shared is None
+        self._shared = shared or SharedPictures()
+
+        # source path, modification time and size -> digest of the source bytes
+        self._digests = self._shared.digests
+        # digest -> original bytes and pixel size of the source
+        self._sources = self._shared.sources
+        self._image_sizes = self._shared.image_sizes
+        # variant -> largest displayed pixel size (in inches) over all placements
+        self._scales: Dict[VariantKey, float] = {}
+        # variant -> bytes to embed, and the scale they were prepared for
+        self._prepared: Dict[VariantKey, bytes] = {}
+        self._prepared_scales: Dict[VariantKey, float] = {}
+
+    def _add_source(self, blob: bytes) -> str:
+        digest = hashlib.sha1(blob).hexdigest()
+        if digest not in self._sources:
+            self._sources[digest] = blob
+            with Image.open(BytesIO(blob)) as image:
+                self._image_sizes[digest] = image.size
+        return digest
+
+    def _digest(self, source: PictureSource) -> str:
+        path = source_path(source)
+        if path is None:
+            # In-memory sources are read (or rendered) on each registration
+            return self._add_source(read_picture_source(source, self.target_dpi))
+
+        # Files changed since they were read, or released since, are read again
+        stat = os.stat(path)
+        path_key = (path, stat.st_mtime_ns, stat.st_size)
+        if self._digests.get(path_key) not in self._sources:
+            with open(path, "rb") as file:
+                self._digests[path_key] = self._add_source(file.read())
+        return self._digests[path_key]
+
+    def _variant(
+        self,
+        source: PictureSource,
+        width_inch: float,
+        height_inch: float,
+        size_mode: str,
+    ) -> Tuple[VariantKey, Tuple[int, int]]:
+        """
+        Return the variant of the picture shown by a placement, along with
+        the pixel size of the part of the source it shows.
+        """
+        digest = self._digest(source)
+        image_size = self._image_sizes[digest]
+        crop_box = None
+        if size_mode == "cover":
+            crop_box = calculate_cover_crop_box(image_size, width_inch, height_inch)
+        if crop_box is not None:
+            image_size = (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1])
+        return (digest, crop_box), image_size
+
+    def register(
+        self,
+        source: PictureSource,
+        width_inch: float,
+        height_inch: float,
+        size_mode: str,
+    ) -> VariantKey:
+        """
+        Register a placement of the picture `source` in a box of the given
+        size. Return the variant of the picture to `get` once prepared.
+        """
+        key, image_size = self._variant(source, width_inch, height_inch, size_mode)
+        if key[1] is not None:
+            # The cropped picture exactly fills the bounding box
+            size_mode = "stretch"
+        scale = _display_scale(size_mode, image_size, width_inch, height_inch)
+        self._scales[key] = max(self._scales.get(key, 0.0), scale)
+        return key
+
+    def prepare(self, workers: Optional[int] = 1) -> None:
+        """
+        Crop and resample every registered picture to the target DPI of its
+        largest placement. With more than one worker, pictures are prepared in
+        a process pool. `None` uses as many workers as there are CPUs.
+        """
+        jobs = {}
+        for key, scale in self._scales.items():
+            # Pictures are prepared again when a larger placement was added
+            # since they were prepared.
+            if self._prepared_scales.get(key, -1.0) >= scale:
+                continue
+            self._prepared_scales[key] = scale
+            digest, crop_box = key
+            # Factor between the pixels needed at the target DPI and the pixels
+            # available. Pictures are never upsampled.
+            factor = 1.0
+            if self.target_dpi is not None:
+                factor = min(1.0, scale * self.target_dpi)
+            if factor == 1 and crop_box is None:
+                self._prepared[key] = self._sources[digest]
+            else:
+                jobs[key] = (self._sources[digest], crop_box, factor, self.jpeg_quality)
+
+        # Pictures already prepared the same way for another presentation
+        shared_prepared = self._shared.prepared
+        for key, job in list(jobs.items()):
+            job_key = (key[0], *job[1:])
+            if job_key in shared_prepared:
+                self._prepared[key] = shared_prepared[job_key]
+                del jobs[key]
+
+        if workers == 1 or len(jobs) < 2:
+            for key, job in jobs.items():
+                self._prepared[key] = prepare_picture(*job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    key: executor.submit(prepare_picture, *job)
+                    for key, job in jobs.items()
+                }
+                for key, future in futures.items():
+                    self._prepared[key] = future.result()
+
+        for key, job in jobs.items():
+            shared_prepared[(key[0], *job[1:])] = self._prepared[key]
+
+    def get(self, key: VariantKey) -> BytesIO:
+        """
+        Return a prepared picture as a file-like object.
+        """
+        return BytesIO(self._prepared[key])
+
+    def release(self, keys: Iterable[VariantKey]) -> None:
+        """
+        Forget the variants `keys` once embedded, along with the sources no
+        other variant shows, unless they are shared with other presentations.
+        Variants registered again are read and prepared again.
+        """
+        for key in set(keys):
+            self._scales.pop(key, None)
+            self._prepared.pop(key, None)
+            self._prepared_scales.pop(key, None)
+        if not self._owns_shared:
+            return
+        self._shared.prepared.clear()
+        shown = {digest for digest, _ in self._scales}
+        for digest in set(self._sources) - shown:
+            del self._sources[digest]
+            del self._image_sizes[digest]
+
+    @property
+    def bytes_original(self) -> int:
+        """
+        Number of bytes of the originals of the prepared variants, counted
+        once per variant, like the variants are embedded.
+        """
+        return sum(len(self._sources[digest]) for digest, _ in self._prepared)
+
+    @property
+    def bytes_embedded(self) -> int:
+        return sum(len(blob) for blob in self._prepared.values())
+
+    @property
+    def bytes_saved(self) -> int:
+        """
+        Number of bytes saved by resampling, compared to embedding the originals.
+        """
+        return self.bytes_original - self.bytes_embedded
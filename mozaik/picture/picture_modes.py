@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional, Tuple
 
 from pptx.util import Inches
 
@@ -19,50 +19,27 @@ def set_picture_stretch_mode(pic: Any, rect: Rect) -> None:
     pic.width += dw
 
 
-def set_picture_cover_mode(pic: Any, rect: Rect) -> None:
+def calculate_cover_crop_box(
+    image_size: Tuple[int, int], width_inch: float, height_inch: float
+) -> Optional[Tuple[int, int, int, int]]:
     """
-    Set picture to cover mode.
+    Calculate the region of the picture visible in cover mode, as a
+    (left, top, right, bottom) box in pixels. Return None when the whole
+    picture is visible.
     """
-    # First, store the gap between the picture and the rect.
-    # The picture sizes are subtracted from the bounding box since
-    # the rect sizes are guaranteed to be larger than the picture.
-    dw = Inches(rect.width_inch) - pic.width
-    dh = Inches(rect.height_inch) - pic.height
-
-    # Temporarily store current picture size to get the size before
-    # gap filling.
-    picture_width = pic.width
-    picture_height = pic.height
-
-    # fill the gap between the picture and the bounding box
-    pic.height += dh
-    pic.width += dw
-
-    # Then fix the aspect ratio of the picture
-    rect_pict_height_ratio = Inches(rect.height_inch) / picture_height
-    rect_pict_width_ratio = Inches(rect.width_inch) / picture_width
-
-    if pic.width < pic.height:
-        pic.width = int(picture_width * rect_pict_height_ratio)
-    elif pic.width > pic.height:
-        pic.height = int(picture_height * rect_pict_width_ratio)
-
-    # Get the difference between the picture and the bounding box.
-    # Now since the picture will be larger than the bounding box,
-    # the rect sizes will be subtracted from the picture sizes instead.
-    new_dw = pic.width - Inches(rect.width_inch)
-    new_dh = pic.height - Inches(rect.height_inch)
-
-    # get ratio of the difference and the picture
-    dw_ratio = new_dw / pic.width
-    dh_ratio = new_dh / pic.height
-
-    # Apply crop symmetrically
-    pic.crop_left = dw_ratio / 2
-    pic.crop_right = dw_ratio / 2
-    pic.crop_top = dh_ratio / 2
-    pic.crop_bottom = dh_ratio / 2
-
-    # Readjust picture size with respect to the bounding box
-    pic.height = Inches(rect.height_inch)
-    pic.width = Inches(rect.width_inch)
+    image_width, image_height = image_size
+
+    # The picture is scaled to cover the bounding box, then the overflowing
+    # side is cropped symmetrically.
+    if image_width * height_inch > image_height * width_inch:
+        visible_width = max(1, round(image_height * width_inch / height_inch))
+        left = (image_width - visible_width) // 2
+        box = (left, 0, left + visible_width, image_height)
+    else:
+        visible_height = max(1, round(image_width * height_inch / width_inch))
+        top = (image_height - visible_height) // 2
+        box = (0, top, image_width, top + visible_height)
+
+    if box == (0, 0, image_width, image_height):
+        return None
+    return box
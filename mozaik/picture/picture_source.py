@@ -0,0 +1,74 @@
+"""
+Sources of the pictures shown in rects.
+
+Besides paths, pictures can be given in memory: encoded bytes (or any object
+supporting the buffer protocol), binary file-like objects, image arrays and
+matplotlib figures. In-memory sources are only read, encoded or rendered at
+compile time.
+"""
+import os
+from io import BytesIO
+from typing import Any, Optional, Union
+
+PictureSource = Union[str, os.PathLike, bytes, bytearray, memoryview, Any]
+
+SUPPORTED_SOURCES = (
+    "path, bytes, buffer, binary file-like object, image array, matplotlib figure"
+)
+
+
+def source_path(source: PictureSource) -> Optional[str]:
+    """
+    Return the path of a picture source given as a path, or None for the
+    in-memory sources.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return None
+
+
+def _encode_array(array: Any) -> bytes:
+    # NumPy is only needed when an array was given
+    import numpy as np
+    from PIL import Image
+
+    array = np.asarray(array)
+    if array.dtype == np.bool_:
+        array = array.astype(np.uint8) * 255
+    elif array.dtype.kind == "f":
+        # Float images use the [0, 1] range, like in matplotlib
+        array = (np.clip(array, 0.0, 1.0) * 255).round().astype(np.uint8)
+    if array.ndim == 3 and array.shape[2] == 1:
+        array = array[:, :, 0]
+
+    output = BytesIO()
+    Image.fromarray(array).save(output, format="PNG")
+    return output.getvalue()
+
+
+def read_picture_source(source: PictureSource, dpi: Optional[float] = None) -> bytes:
+    """
+    Return the encoded picture of an in-memory source. Figures are rendered
+    as PNG at `dpi`, or at their own DPI when it is None.
+    """
+    # Arrays also support the buffer protocol, so they are recognized before
+    # the buffers.
+    if hasattr(source, "savefig"):
+        output = BytesIO()
+        source.savefig(output, format="png", dpi=dpi or "figure")
+        return output.getvalue()
+    if hasattr(source, "__array_interface__"):
+        return _encode_array(source)
+    if hasattr(source, "read"):
+        # Like python-pptx, the whole stream is read from its start
+        if source.seekable():
+            source.seek(0)
+        return source.read()
+
+    try:
+        return bytes(memoryview(source))
+    except TypeError:
+        raise TypeError(
+            f"Unsupported picture source: {type(source).__name__}"
+            + f"\nSupported sources: {SUPPORTED_SOURCES}"
+        ) from None
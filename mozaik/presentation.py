@@ -1,13 +1,61 @@
 """
 TODO: write docstring
 """
-from typing import List
+import functools
+import gc
+import itertools
+import os
+import threading
+from copy import deepcopy
+from io import BytesIO
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from pptx import Presentation as _Presentation
-from pptx.enum.text import PP_ALIGN
-from pptx.util import Inches
-from .picture.picture_modes import set_picture_cover_mode, set_picture_stretch_mode
-from .slide import Rect, Slide
+from pptx.enum.text import MSO_AUTO_SIZE, PP_ALIGN
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml import parse_xml
+from pptx.parts.slide import SlidePart
+from pptx.util import Inches, Pt
+from .markdown import fill_markdown, markdown_plain_text, parse_markdown
+from .package_writer import (
+    PackageUpdateWriter,
+    StreamingPackageWriter,
+    write_package,
+)
+from .parallel import ExportedSlide, iter_built_slides
+from .picture.figure_cache import FigureCache, default_cache_directory
+from .picture.picture_cache import PictureCache, SharedPictures, VariantKey
+from .picture.picture_modes import set_picture_stretch_mode
+from .profiling import add_bytes, phase
+from .slide import Rect, Slide, _outer_inches
+from .table.table_builder import fill_table, iter_table_rows, take_rows
+from .template import (
+    PreparedTemplate,
+    SlideTemplate,
+    _iter_relationship_attributes,
+    _related_image_parts,
+    clone_shapes,
+)
+from .text_fit import TextFitter, text_fitter
+from .validation import ValidationError, validate_slides
+
+if TYPE_CHECKING:
+    from .aio import AsyncRunner
 
 config = {
     "slide_title_font_size": 0.5,  # in inches
@@ -20,9 +68,38 @@ config = {
     "slide_right_padding": 0.1,  # in inches
     "slide_top_padding": 0.1,  # in inches
     "slide_bottom_padding": 0.1,  # in inches
+    "picture_dpi": 220,  # resampling target, None keeps the original pictures
+    "picture_jpeg_quality": 90,
+    "picture_workers": 1,  # processes preparing pictures, None uses all CPUs
+    "table_row_height": 0.4,  # in inches, used to paginate tables
+    "figure_cache_dir": default_cache_directory(),  # None keeps figures in memory
+    "figure_workers": None,  # processes rendering figures, None uses all CPUs
+    "compile_workers": 1,  # processes building slides, None uses all CPUs
+    "store_compressed_media": True,  # store pictures and videos without deflating
+    "xml_compression_level": 6,  # deflate level of the other parts, 0 to 9
+    "stream_batch_size": 16,  # slides whose media are held at once when streaming
+    "text_font_size": 0.25,  # in inches, largest size of fitted text
+    "text_min_font_size": 0.11,  # in inches, smallest size of shrunk text
+    "text_font_path": None,  # font measuring fitted text, None looks up Calibri's
 }
 
 
+def _iter_batches(slides: Iterable[Slide], batch_size: int) -> Iterator[List[Slide]]:
+    slides = iter(slides)
+    while True:
+        batch = list(itertools.islice(slides, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class CompilationCancelled(Exception):
+    """
+    Raised in the thread compiling a presentation when its compilation was
+    cancelled from an event loop.
+    """
+
+
 class Presentation:
     """
     TODO: write docstring
@@ -33,11 +110,55 @@ class Presentation:
         self.presentation_width = presentation_width
         self.presentation_height = presentation_height
         self.prs: _Presentation = None
+        self.picture_cache: PictureCache = None
+        # Pictures read and prepared along with other presentations
+        self.shared_pictures: Optional[SharedPictures] = None
+        self.figure_cache: FigureCache = None
+        self._prepared_templates: Dict[SlideTemplate, PreparedTemplate] = {}
+        # Slides of the last compilation, with their version and the ids of
+        # the PPT slides built for them
+        self._compiled_slides: List[Tuple[Slide, int, List[int]]] = []
+        self._compiled_settings: Tuple = None
+        self._slide_partnames: Set[PackURI] = set()
+        self._next_slide_id = 256
+        # rect -> picture to embed, for the rects of the slides being compiled
+        self._picture_variants: Dict[Rect, VariantKey] = {}
+        # rect -> rendered figure, for the rects of the slides being compiled
+        self._figure_keys: Dict[Rect, str] = {}
+        # cache key of an object and size of its rect -> origin of the rect,
+        # shape elements and their image parts, for the current compilation
+        self._object_shapes: Dict[Tuple, Tuple[Tuple[int, int], List, Dict]] = {}
+        # rect -> remaining rows and header of a table continued on next slides
+        self._table_continuations: Dict[Rect, Tuple[Iterator, List[str]]] = {}
+        # rect -> remaining text continued on next slides
+        self._text_continuations: Dict[Rect, str] = {}
+        self.text_fitter: TextFitter = None
+        # Held while compiling from an event loop, with the event cancelling
+        # that compilation
+        self._lock = threading.Lock()
+        self._cancel_event: Optional[threading.Event] = None
 
     def compile_picture(self, slide: Slide, rect: Rect) -> None:
         # Apply margin to the rect
         rect.apply_margin()
 
+        size_mode = rect.content["picture_size_mode"]
+        picture = self.picture_cache.get(self._picture_variants[rect])
+        add_bytes(len(picture.getvalue()))
+
+        # In cover mode, only the visible region of the picture is embedded.
+        # It has the aspect ratio of the bounding box, so it is simply placed
+        # with the size of the bounding box.
+        if size_mode == "cover":
+            slide.shapes.add_picture(
+                picture,
+                Inches(rect.left_inch),
+                Inches(rect.top_inch),
+                Inches(rect.width_inch),
+                Inches(rect.height_inch),
+            )
+            return
+
         # keep aspect ratio while fitting in the bounding box
         picture_width = Inches(rect.width_inch)
         picture_height = Inches(rect.height_inch)
@@ -53,7 +174,7 @@ class Presentation:
         # set to None, which means that the picture will be scaled
         # to the bounding box proportionally.
         pic = slide.shapes.add_picture(
-            rect.content["picture_path"],
+            picture,
             Inches(rect.left_inch),
             Inches(rect.top_inch),
             picture_width,
@@ -61,20 +182,55 @@ class Presentation:
         )
 
         # Set picture mode
-        if rect.content["picture_size_mode"] == "fit":
+        if size_mode == "fit":
             pass
-        elif rect.content["picture_size_mode"] == "stretch":
+        elif size_mode == "stretch":
             set_picture_stretch_mode(pic, rect)
-        elif rect.content["picture_size_mode"] == "cover":
-            set_picture_cover_mode(pic, rect)
         else:
             raise ValueError(
                 f"Unknown picture size mode: {rect.content['picture_size_mode']}"
                 + "\nAvailable modes: fit, stretch, cover"
             )
 
+    def compile_figure(self, slide: Slide, rect: Rect) -> None:
+        # Figures are rendered at the size of the rect inside its margins
+        rect.apply_margin()
+        figure = self.figure_cache.get(self._figure_keys[rect])
+        add_bytes(len(figure.getvalue()))
+        slide.shapes.add_picture(
+            figure,
+            Inches(rect.left_inch),
+            Inches(rect.top_inch),
+            Inches(rect.width_inch),
+            Inches(rect.height_inch),
+        )
+
     def compile_text(self, slide: Slide, rect: Rect) -> None:
         rect.apply_margin()
+        self.compile_text_page(slide, rect, rect.content["text"])
+
+    def compile_text_page(self, slide: Slide, rect: Rect, text: str) -> None:
+        """
+        Add the textbox of the rect. Shrunk text takes the largest font size
+        fitting the rect. Paginated text only takes the lines fitting in the
+        rect, the remaining text is kept for the continuation slides.
+        """
+        font_size = None
+        if rect.content["text_fit"] == "shrink":
+            font_size = self.text_fitter.shrink(text, rect.width_inch, rect.height_inch)
+        elif rect.content["text_fit"] == "paginate":
+            font_size = self.text_fitter.font_size
+            text, remaining_text = self.text_fitter.split(
+                text, rect.width_inch, rect.height_inch
+            )
+            if remaining_text is not None:
+                self._text_continuations[rect] = remaining_text
+        elif rect.content["text_fit"] is not None:
+            raise ValueError(
+                f"Unknown text fit mode: {rect.content['text_fit']}"
+                + "\nAvailable modes: shrink, paginate"
+            )
+
         textbox = slide.shapes.add_textbox(
             Inches(rect.left_inch),
             Inches(rect.top_inch),
@@ -82,7 +238,14 @@ class Presentation:
             Inches(rect.height_inch),
         )
         textbox.text_frame.word_wrap = True
-        textbox.text_frame.text = rect.content["text"]
+        textbox.text_frame.text = text
+        add_bytes(len(text.encode("utf-8")))
+        if font_size is not None:
+            # Fitted text keeps its size, instead of being resized by PowerPoint
+            textbox.text_frame.auto_size = MSO_AUTO_SIZE.NONE
+            for paragraph in textbox.text_frame.paragraphs:
+                for run in paragraph.runs:
+                    run.font.size = Pt(round(font_size * 72, 2))
 
         if rect.content["horizontal_alignment"] == "left":
             textbox.text_frame.paragraphs[0].alignment = PP_ALIGN.LEFT
@@ -98,11 +261,60 @@ class Presentation:
                 + "\nAvailable modes: left, center, right, justify"
             )
 
+    def compile_markdown(self, slide: Slide, rect: Rect) -> None:
+        """
+        Add the textbox of the rect, with a paragraph per heading, list item,
+        code line or paragraph of the Markdown. Links are related to the
+        slide as hyperlinks.
+        """
+        rect.apply_margin()
+        blocks = parse_markdown(rect.content["markdown"])
+
+        font_size = None
+        if rect.content["text_fit"] == "shrink":
+            font_size = self.text_fitter.shrink(
+                markdown_plain_text(blocks), rect.width_inch, rect.height_inch
+            )
+        elif rect.content["text_fit"] is not None:
+            raise ValueError(
+                f"Unknown Markdown fit mode: {rect.content['text_fit']}"
+                + "\nAvailable modes: shrink"
+            )
+
+        textbox = slide.shapes.add_textbox(
+            Inches(rect.left_inch),
+            Inches(rect.top_inch),
+            Inches(rect.width_inch),
+            Inches(rect.height_inch),
+        )
+        textbox.text_frame.word_wrap = True
+        if font_size is not None:
+            textbox.text_frame.auto_size = MSO_AUTO_SIZE.NONE
+
+        def relate_hyperlink(url: str) -> str:
+            return slide.part.relate_to(url, RT.HYPERLINK, is_external=True)
+
+        add_bytes(
+            fill_markdown(textbox.text_frame, blocks, font_size, relate_hyperlink)
+        )
+
     def compile_table(self, slide: Slide, rect: Rect) -> None:
         rect.apply_margin()
-        n_rows = len(rect.content["table_data"])
-        n_cols = len(rect.content["table_data"][0])
+        rows = iter_table_rows(rect.content["table_data"])
+        self.compile_table_page(slide, rect, rows)
 
+    def compile_table_page(
+        self,
+        slide: Slide,
+        rect: Rect,
+        rows: Iterator[List[str]],
+        header: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Add the table of the rect. Paginated tables only take the rows fitting
+        in the rect, the remaining rows are kept for the continuation slides,
+        where `header` is repeated.
+        """
         # This will set table height according to the content
         table_height = Inches(0)
 
@@ -116,18 +328,52 @@ class Presentation:
                 + "\nAvailable modes: stretch, auto"
             )
 
+        if rect.content["table_paginate"]:
+            # Number of rows fitting in the rect, including the header
+            rows_per_page = max(1, int(rect.height_inch // config["table_row_height"]))
+            page_header = [] if header is None else [header]
+            page, remaining_rows = take_rows(
+                rows, max(1, rows_per_page - len(page_header))
+            )
+            page = page_header + page
+            table_height = table_height * len(page) // rows_per_page
+
+            if remaining_rows is not None:
+                if header is None and rect.content["table_repeat_header"]:
+                    header = page[0]
+                self._table_continuations[rect] = (remaining_rows, header)
+        else:
+            page = list(rows)
+
+        if not page:
+            raise ValueError("Table data has no rows")
+
         table = slide.shapes.add_table(
-            n_rows,
-            n_cols,
+            1,
+            len(page[0]),
             Inches(rect.left_inch),
             Inches(rect.top_inch),
             Inches(rect.width_inch),
             table_height,
         ).table
 
-        for row_idx, row in enumerate(rect.content["table_data"]):
-            for col_idx, cell in enumerate(row):
-                table.cell(row_idx, col_idx).text = cell
+        # All rows are built at once
+        fill_table(table._tbl, page, table_height)
+
+    def compile_continuations(self, __slide, slide: Slide) -> None:
+        # Continuation slides repeat the title, and the overflowing tables
+        # and text keep their place in the layout.
+        if slide.title:
+            self.compile_slide_title(__slide, slide.title)
+
+        table_continuations = self._table_continuations
+        text_continuations = self._text_continuations
+        self._table_continuations = {}
+        self._text_continuations = {}
+        for rect, (rows, header) in table_continuations.items():
+            self.compile_table_page(__slide, rect, rows, header)
+        for rect, text in text_continuations.items():
+            self.compile_text_page(__slide, rect, text)
 
     def compile_slide_title(self, slide: Slide, title: str) -> None:
         # If the slide has a title, we need to add it as a text box
@@ -146,56 +392,574 @@ class Presentation:
         paragraph.font.bold = True
         paragraph.text = title
 
-    def compile(self) -> None:
+    def compile_object(self, slide: Slide, rect: Rect) -> None:
         """
-        Compile slides into MS PowerPoint presentation.
+        Attach the object of the rect. The shapes of objects declaring a cache
+        key are built once per key and rect size, and cloned afterwards.
         """
-        self.prs = _Presentation()
-        self.prs.slide_width = Inches(self.presentation_width)
-        self.prs.slide_height = Inches(self.presentation_height)
+        obj = rect.content["object"]
+        key = obj.cache_key()
+        if key is None:
+            obj.attach(slide, rect)
+            return
 
-        for slide in self.slides:
-            # Add PPT blank layout slide
-            __slide = self.prs.slides.add_slide(self.prs.slide_layouts[6])
-
-            slide_content_height = self.presentation_height
-            if slide.title:
-                # shift slide_content_height by title height
-                slide_content_height -= (
-                    config["slide_title_font_size"]
-                    + config["slide_title_top_margin"]
-                    + config["slide_title_bottom_margin"]
+        left_inch, top_inch, width_inch, height_inch = rect._outer_inches
+        margins = (
+            rect.left_margin,
+            rect.top_margin,
+            rect.right_margin,
+            rect.bottom_margin,
+        )
+        key = (type(obj), key, width_inch, height_inch, margins)
+        origin = (Inches(left_inch), Inches(top_inch))
+        cached = self._object_shapes.get(key)
+        if cached is not None:
+            cached_origin, elements, image_parts = cached
+            offset = (origin[0] - cached_origin[0], origin[1] - cached_origin[1])
+            next_shape_id = slide.shapes._spTree.max_shape_id + 1
+            clone_shapes(slide, elements, image_parts, next_shape_id, offset)
+            return
+
+        elements = slide.shapes._spTree
+        n_elements = len(elements)
+        obj.attach(slide, rect)
+        new_elements = elements[n_elements:]
+        # Objects relating to other parts than images (like charts) can not
+        # be cloned
+        image_parts = _related_image_parts(slide, new_elements)
+        if image_parts is not None:
+            self._object_shapes[key] = (
+                origin,
+                [deepcopy(element) for element in new_elements],
+                image_parts,
+            )
+
+    def compile_rect(self, slide: Slide, rect: Rect) -> None:
+        if rect.content["type"] is None:
+            return
+
+        with phase(rect.content["type"]):
+            if rect.content["type"] == "picture":
+                self.compile_picture(slide, rect)
+            elif rect.content["type"] == "figure":
+                self.compile_figure(slide, rect)
+            elif rect.content["type"] == "text":
+                self.compile_text(slide, rect)
+            elif rect.content["type"] == "markdown":
+                self.compile_markdown(slide, rect)
+            elif rect.content["type"] == "table":
+                self.compile_table(slide, rect)
+            elif rect.content["type"] == "object":
+                self.compile_object(slide, rect)
+
+    def compile_slide(self, __slide, slide: Slide) -> None:
+        # Instances of an already compiled template are stamped out from the
+        # shapes of the first instance.
+        prepared_template = self._prepared_templates.get(slide.template)
+        if prepared_template is not None and prepared_template.can_stamp(slide):
+            prepared_template.stamp(self, __slide, slide)
+            return
+
+        # Shape tree elements of the slide, to prepare the template afterwards
+        elements = __slide.shapes._spTree
+
+        # If the slide has a title, add it first
+        n_elements = len(elements)
+        if slide.title:
+            self.compile_slide_title(__slide, slide.title)
+        title_elements = elements[n_elements:]
+
+        # Finally compile all slide contents
+        rect_elements = {}
+        for rect in slide.rects.values():
+            n_elements = len(elements)
+            self.compile_rect(__slide, rect)
+            rect_elements[rect.char] = elements[n_elements:]
+
+        if slide.template is not None and prepared_template is None:
+            self._prepared_templates[slide.template] = PreparedTemplate(
+                slide, __slide, title_elements, rect_elements
+            )
+
+    def prepare_pictures(self, slides: List[Slide]) -> None:
+        """
+        Register every picture placement of `slides` and prepare the pictures
+        to embed. Geometry of the rects must be calculated beforehand.
+        """
+        self._picture_variants = {}
+        for slide in slides:
+            for rect in slide.rects.values():
+                if rect.content["type"] != "picture":
+                    continue
+                # The picture is placed inside the margins of the rect
+                rect.apply_margin()
+                self._picture_variants[rect] = self.picture_cache.register(
+                    rect.content["picture_source"],
+                    rect.width_inch,
+                    rect.height_inch,
+                    rect.content["picture_size_mode"],
                 )
+        bytes_embedded = self.picture_cache.bytes_embedded
+        self.picture_cache.prepare(config["picture_workers"])
+        add_bytes(self.picture_cache.bytes_embedded - bytes_embedded)
 
-            # Originally we only have unit sizes (in tiles). We want to convert them
-            # to inches. Following method will calculate the size of the slide in inches
-            # and keep them in the rect as properties.
+    def prepare_figures(self, slides: List[Slide]) -> None:
+        """
+        Register every figure of `slides` and render the figures missing from
+        the figure cache. Geometry of the rects must be calculated beforehand.
+        """
+        self._figure_keys = {}
+        for slide in slides:
             for rect in slide.rects.values():
-                rect.calculate_inches(
-                    slide,
-                    self.presentation_width,
-                    slide_content_height,
-                    config,
+                if rect.content["type"] != "figure":
+                    continue
+                rect.apply_margin()
+                self._figure_keys[rect] = self.figure_cache.register(
+                    rect.content["figure"], rect.width_inch, rect.height_inch
                 )
+        self.figure_cache.render(config["figure_workers"])
+        for key in set(self._figure_keys.values()):
+            add_bytes(len(self.figure_cache.get(key).getvalue()))
 
-            # If the slide has a title, add it first
-            if slide.title:
-                self.compile_slide_title(__slide, slide.title)
+    def calculate_geometry(self, slides: List[Slide]) -> None:
+        """
+        Calculate the position and size in inches of the rects of `slides`.
+        Decks repeat a few layouts, so the geometry of a rect is calculated
+        once per grid, title and tiles, then shared by the rects alike.
+        """
+        title_height = (
+            config["slide_title_font_size"]
+            + config["slide_title_top_margin"]
+            + config["slide_title_bottom_margin"]
+        )
+        # grid and title -> tiles of a rect -> position and size in inches
+        geometries: Dict[Tuple[int, int, bool], Dict[Tuple, Tuple]] = {}
+        for slide in slides:
+            has_title = bool(slide.title)
+            geometry = geometries.setdefault(
+                (slide.n_rows, slide.n_cols, has_title), {}
+            )
 
-            # Finally compile all slide contents
+            # Originally we only have unit sizes (in tiles). We want to convert them
+            # to inches.
             for rect in slide.rects.values():
-                if rect.content["type"] == "picture":
-                    self.compile_picture(__slide, rect)
-                elif rect.content["type"] == "text":
-                    self.compile_text(__slide, rect)
-                elif rect.content["type"] == "table":
-                    self.compile_table(__slide, rect)
-                elif rect.content["type"] == "object":
-                    rect.content["object"].attach(__slide, rect)
+                tiles = (rect.left, rect.top, rect.width, rect.height)
+                inches = geometry.get(tiles)
+                if inches is None:
+                    slide_content_height = self.presentation_height
+                    if has_title:
+                        slide_content_height -= title_height
+                    inches = geometry[tiles] = _outer_inches(
+                        rect,
+                        slide,
+                        self.presentation_width,
+                        slide_content_height,
+                        config,
+                    )
+                rect.set_outer_inches(inches)
+
+    def compile(self, force: bool = False) -> None:
+        """
+        Compile slides into MS PowerPoint presentation. Once compiled, only
+        the slides which changed since the previous compilation are built
+        again, unless `force` is set.
+        """
+        with phase("compile"):
+            # Everything is built again when the presentation settings changed
+            settings = (self.presentation_width, self.presentation_height, dict(config))
+            if force or self.prs is None or settings != self._compiled_settings:
+                self._reset_compilation()
+                self._compiled_settings = settings
+
+            compiled_slides, changed_slides = self._find_changed_slides()
+
+            with phase("geometry"):
+                self.calculate_geometry(changed_slides)
+
+            # Pictures are shared between slides, so they are prepared all at once
+            # before any slide is built.
+            with phase("pictures"):
+                self.prepare_pictures(changed_slides)
+            with phase("figures"):
+                self.prepare_figures(changed_slides)
+            self._check_cancelled()
+
+            sldIdLst = self.prs.slides._sldIdLst
+            new_slide_ids = []
+            n_slides = len(sldIdLst)
+            for slide in self._build_slides(changed_slides):
+                new_slide_ids.append([sldId.id for sldId in sldIdLst[n_slides:]])
+                n_slides = len(sldIdLst)
+
+            # New PPT slides were added at the end, so they are put back in the
+            # order of the slides.
+            self._compiled_slides = []
+            sldIds = {sldId.id: sldId for sldId in sldIdLst}
+            new_slide_ids = iter(new_slide_ids)
+            for slide, version, slide_ids in compiled_slides:
+                if slide_ids is None:
+                    slide_ids = next(new_slide_ids)
+                self._compiled_slides.append((slide, version, slide_ids))
+                for slide_id in slide_ids:
+                    sldIdLst.append(sldIds[slide_id])
+
+    def _reset_compilation(self) -> None:
+        # Start over from an empty PowerPoint presentation
+        self.prs = _Presentation()
+        self.prs.slide_width = Inches(self.presentation_width)
+        self.prs.slide_height = Inches(self.presentation_height)
+        self.picture_cache = PictureCache(
+            config["picture_dpi"],
+            config["picture_jpeg_quality"],
+            self.shared_pictures,
+        )
+        self.figure_cache = FigureCache(
+            config["figure_cache_dir"], config["picture_dpi"]
+        )
+        self.text_fitter = text_fitter(
+            config["text_font_path"],
+            config["text_font_size"],
+            config["text_min_font_size"],
+        )
+        self._prepared_templates = {}
+        self._object_shapes = {}
+        self._compiled_slides = []
+        self._compiled_settings = None
+        self._slide_partnames = set()
+        self._next_slide_id = 256
+
+    def _build_slides(self, slides: List[Slide]) -> Iterator[Slide]:
+        """
+        Add the PPT slides of `slides` in order, yielding each slide once its
+        PPT slides are added. With several compile workers, slides are built
+        in worker processes and only added by this process.
+        """
+        self._table_continuations = {}
+        self._text_continuations = {}
+        workers = config["compile_workers"]
+        if workers == 1 or len(slides) < 2:
+            for slide in slides:
+                self._check_cancelled()
+                self._build_slide(slide)
+                yield slide
+            return
+
+        for slide, pages in iter_built_slides(self, config, slides, workers):
+            self._check_cancelled()
+            # Slides which could not be exported are built here
+            if pages is None:
+                self._build_slide(slide)
+            else:
+                with phase("slide"):
+                    for page in pages:
+                        self._add_exported_slide(page)
+            yield slide
+
+    def _check_cancelled(self) -> None:
+        if self._cancel_event is None or not self._cancel_event.is_set():
+            return
+        # The PowerPoint presentation holds part of the slides, so the next
+        # compilation starts over.
+        self._compiled_settings = None
+        raise CompilationCancelled()
+
+    def _add_exported_slide(self, page: ExportedSlide) -> None:
+        blob, relationships = page
+        __slide = self._add_pptx_slide()
+
+        # Relate the pictures in the order the worker did, which is the order
+        # of a serial compilation
+        rIds = {}
+        for rId, reltype, is_external, target in relationships:
+            if is_external:
+                rIds[rId] = __slide.part.relate_to(target, reltype, is_external=True)
+            else:
+                _, rIds[rId] = __slide.part.get_or_add_image_part(BytesIO(target))
+
+        element = parse_xml(blob)
+        # The rIds are normally the worker's ones, the XML is only rewritten
+        # when they are not
+        if any(rId != new_rId for rId, new_rId in rIds.items()):
+            for descendant, attribute in _iter_relationship_attributes(element):
+                descendant.set(attribute, rIds[descendant.get(attribute)])
+        __slide.part._element[:] = element[:]
+
+    def _build_slide(self, slide: Slide) -> None:
+        """
+        Add the PPT slides of a slide: the slide itself, and the continuation
+        slides of its overflowing tables.
+        """
+        with phase("slide"):
+            __slide = self._add_pptx_slide()
+            self.compile_slide(__slide, slide)
+
+            # Tables and text overflowing their rect continue on the next slides
+            while self._table_continuations or self._text_continuations:
+                __slide = self._add_pptx_slide()
+                self.compile_continuations(__slide, slide)
+
+    def _find_changed_slides(
+        self,
+    ) -> Tuple[List[Tuple[Slide, int, Optional[List[int]]]], List[Slide]]:
+        """
+        Match the slides with the PPT slides of the previous compilation, and
+        remove the PPT slides of the changed and removed slides. Return the
+        slides with their version and kept PPT slide ids (None when they have
+        to be built), along with the slides to build.
+        """
+        previous_slides: Dict[Slide, List[Tuple[int, List[int]]]] = {}
+        for slide, version, slide_ids in self._compiled_slides:
+            previous_slides.setdefault(slide, []).append((version, slide_ids))
+
+        compiled_slides = []
+        changed_slides = []
+        for slide in self.slides:
+            version = slide.version
+            previous = previous_slides.get(slide, [])
+            for index, (previous_version, slide_ids) in enumerate(previous):
+                if previous_version == version:
+                    compiled_slides.append((slide, version, slide_ids))
+                    del previous[index]
+                    break
+            else:
+                compiled_slides.append((slide, version, None))
+                changed_slides.append(slide)
+
+        for previous in previous_slides.values():
+            for _, slide_ids in previous:
+                self._remove_slides(slide_ids)
+
+        return compiled_slides, changed_slides
+
+    def _add_pptx_slide(self) -> Any:
+        """
+        Add a PPT slide with the blank layout. python-pptx looks up every
+        slide of the presentation to add one, which makes large decks slow to
+        build, so the slide part is related and listed directly instead.
+        """
+        slide_layout = self.prs.slide_layouts[6]
+
+        # Slide parts are named after the number of slides. Once slides were
+        # removed, the name can belong to a slide kept from the previous
+        # compilation.
+        slide_number = len(self._slide_partnames) + 1
+        partname = PackURI(f"/ppt/slides/slide{slide_number}.xml")
+        while partname in self._slide_partnames:
+            slide_number += 1
+            partname = PackURI(f"/ppt/slides/slide{slide_number}.xml")
+        self._slide_partnames.add(partname)
+
+        slide_part = SlidePart.new(partname, self.prs.part.package, slide_layout.part)
+        rId = self.prs.part.rels._add_relationship(RT.SLIDE, slide_part)
+        __slide = slide_part.slide
+        __slide.shapes.clone_layout_placeholders(slide_layout)
+        self.prs.slides._sldIdLst._add_sldId(id=self._next_slide_id, rId=rId)
+        self._next_slide_id += 1
+        return __slide
+
+    def _remove_slides(self, slide_ids: List[int]) -> None:
+        sldIdLst = self.prs.slides._sldIdLst
+        for sldId in list(sldIdLst):
+            if sldId.id in slide_ids:
+                self._slide_partnames.remove(
+                    self.prs.part.related_part(sldId.rId).partname
+                )
+                sldIdLst.remove(sldId)
+                self.prs.part.drop_rel(sldId.rId)
 
     def add_slide(self, slide: Slide):
         self.slides.append(slide)
 
-    def save(self, name: str):
+    def validate(self) -> None:
+        """
+        Check every slide and rect without building any shape, and raise a
+        ValidationError listing all the errors found. Saving validates the
+        slides first, only the slides which changed since the previous
+        compilation when they are not all built again.
+        """
+        errors = validate_slides(self.slides)
+        if errors:
+            raise ValidationError(errors)
+
+    def _validate_changed(self) -> None:
+        """
+        Validate the slides `compile` builds again. Slides it keeps from the
+        previous compilation were already validated, and their pictures are
+        not read again.
+        """
+        settings = (self.presentation_width, self.presentation_height, dict(config))
+        if self.prs is None or settings != self._compiled_settings:
+            self.validate()
+            return
+        compiled = {(slide, version) for slide, version, _ in self._compiled_slides}
+        errors = validate_slides(
+            self.slides, skip=lambda slide: (slide, slide.version) in compiled
+        )
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, name: Union[str, os.PathLike, BinaryIO], streaming: bool = False):
+        """
+        Save the presentation to the file `name`, which can also be a writable
+        binary stream. With `streaming`, each slide is written as soon as it is
+        built and released right away, so memory does not grow with the number
+        of slides.
+        """
+        if streaming:
+            self.validate()
+            self.save_streaming(name)
+            return
+
+        self._validate_changed()
         self.compile()
-        self.prs.save(name)
+        with phase("serialize"):
+            write_package(
+                name,
+                self.prs.part.package,
+                config["store_compressed_media"],
+                config["xml_compression_level"],
+            )
+
+    def save_streaming(self, name: Union[str, os.PathLike, BinaryIO]) -> None:
+        """
+        Compile the slides one at a time into the file (or stream) `name`,
+        writing each slide with its pictures and charts before building the
+        next one. Nothing is kept for later compilations.
+        """
+        self._write_slide_by_slide(functools.partial(StreamingPackageWriter, name))
+
+    def save_into(
+        self,
+        base: Union[str, os.PathLike, BinaryIO],
+        name: Union[str, os.PathLike, BinaryIO],
+        replace: Sequence[int] = (),
+    ) -> None:
+        """
+        Save a copy of the existing presentation `base` to `name`, with the
+        slides added in place of its slides at the indices `replace` (which
+        are removed), or after its last slide. The slides use the blank layout
+        of `base`, and the parts of `base` are copied without being parsed.
+        Slides are compiled one at a time, like `save_streaming`. The slide
+        size of `base` must be the size of the presentation.
+        """
+        self.validate()
+        self._write_slide_by_slide(
+            functools.partial(PackageUpdateWriter, name, base=base, replace=replace)
+        )
+
+    def save_slides(
+        self,
+        name: Union[str, os.PathLike, BinaryIO],
+        slides: Iterable[Slide],
+        batch_size: Optional[int] = None,
+    ) -> None:
+        """
+        Save `slides` after the slides of the presentation to the file (or
+        stream) `name`, like `save_streaming`, while reading them. Slides are
+        read, validated and written `batch_size` at a time (by default
+        `config["stream_batch_size"]`), so they can be generated on the fly
+        (like by `mozaik.markdown.iter_markdown_slides`) without ever being
+        all in memory. They are not added to the presentation.
+        """
+        self.validate()
+        self._write_slide_by_slide(
+            functools.partial(StreamingPackageWriter, name), slides, batch_size
+        )
+
+    def _write_slide_by_slide(
+        self,
+        writer_factory: Callable[..., StreamingPackageWriter],
+        extra_slides: Iterable[Slide] = (),
+        batch_size: Optional[int] = None,
+    ) -> None:
+        """
+        Write the slides of the presentation, then `extra_slides`, with a
+        writer made by `writer_factory`. Pictures and figures are prepared for
+        a batch of slides at a time, and released once the batch is written,
+        so memory does not grow with the number of distinct pictures. When
+        anything fails, the writer is aborted, which removes the file written
+        so far.
+        """
+        batch_size = batch_size or config["stream_batch_size"]
+        # The slides of the presentation are validated beforehand
+        batches = itertools.chain(
+            ((slides, False) for slides in _iter_batches(self.slides, batch_size)),
+            ((slides, True) for slides in _iter_batches(extra_slides, batch_size)),
+        )
+        try:
+            with phase("compile"):
+                self._reset_compilation()
+                writer = writer_factory(
+                    package=self.prs.part.package,
+                    store_compressed_media=config["store_compressed_media"],
+                    compression_level=config["xml_compression_level"],
+                )
+                try:
+                    self._write_batches(writer, batches)
+                    with phase("serialize"):
+                        writer.close()
+                except BaseException:
+                    writer.abort()
+                    raise
+        finally:
+            # The PowerPoint presentation was emptied while writing
+            self.prs = None
+
+    def _write_batches(
+        self,
+        writer: StreamingPackageWriter,
+        batches: Iterable[Tuple[List[Slide], bool]],
+    ) -> None:
+        sldIdLst = self.prs.slides._sldIdLst
+        n_slides = len(self.slides)
+        for slides, validate in batches:
+            if validate:
+                errors = validate_slides(slides, first_number=n_slides + 1)
+                if errors:
+                    raise ValidationError(errors)
+                n_slides += len(slides)
+            with phase("geometry"):
+                self.calculate_geometry(slides)
+            with phase("pictures"):
+                self.prepare_pictures(slides)
+            with phase("figures"):
+                self.prepare_figures(slides)
+            self._check_cancelled()
+
+            for slide in self._build_slides(slides):
+                with phase("serialize"):
+                    for sldId in sldIdLst:
+                        writer.write_slide(self.prs.part.related_part(sldId.rId))
+                    self._remove_slides([sldId.id for sldId in sldIdLst])
+            # The writer stores each part once, later batches showing the same
+            # pictures prepare them again
+            self.picture_cache.release(self._picture_variants.values())
+            self.figure_cache.release(self._figure_keys.values())
+            # Parts of the removed slides reference each other, so they are
+            # only freed by the cyclic garbage collector
+            gc.collect()
+
+    async def compile_async(
+        self, force: bool = False, runner: Optional["AsyncRunner"] = None
+    ) -> None:
+        """
+        Compile the presentation without blocking the event loop, using
+        `runner` or the default runner of the module `mozaik.aio`.
+        """
+        from .aio import default_runner
+
+        await (runner or default_runner).compile(self, force)
+
+    async def save_async(
+        self,
+        name: Union[str, os.PathLike, BinaryIO],
+        streaming: bool = False,
+        runner: Optional["AsyncRunner"] = None,
+    ) -> None:
+        """
+        Save the presentation without blocking the event loop, using `runner`
+        or the default runner of the module `mozaik.aio`.
+        """
+        from .aio import default_runner
+
+        await (runner or default_runner).save(self, name, streaming)
@@ -0,0 +1,672 @@
+"""
+Previews of the slides of a presentation, as SVG or PNG pictures.
+
+Previews are drawn from the slides themselves, without building or converting
+the PowerPoint presentation: rects are placed with the geometry of the
+compilation, pictures with their size mode, text is wrapped and fitted with
+the metrics of its font, and titles and tables are laid out with an average
+character width. They are wireframes to check decks on every build or in a web
+page, not exact renderings of PowerPoint.
+
+Like in compiled decks, slides with overflowing paginated tables are followed
+by the previews of their continuation slides.
+"""
+import base64
+import os
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from .markdown import markdown_plain_text, parse_markdown
+from .picture.picture_modes import calculate_cover_crop_box
+from .picture.picture_source import PictureSource, read_picture_source, source_path
+from .presentation import Presentation, config
+from .slide import Rect, Slide
+from .table.table_builder import iter_table_rows, take_rows
+from .text_fit import text_fitter
+
+_FORMATS = ("svg", "png")
+
+# Font size of textboxes and tables without a size, in inches
+_FONT_SIZE = 18 / 72
+# Insets of the text in textboxes and table cells, in inches
+_TEXT_INSET_X = 0.1
+_TEXT_INSET_Y = 0.05
+# Average width of the characters and height of the lines, relative to the
+# font size
+_CHAR_WIDTH = 0.5
+_LINE_HEIGHT = 1.2
+# Height of the rows of tables growing with their content, in inches
+_ROW_HEIGHT = _FONT_SIZE * _LINE_HEIGHT + 2 * _TEXT_INSET_Y
+
+_FONT_FAMILY = "Calibri, Carlito, sans-serif"
+_TEXT_COLOR = "#000000"
+_OUTLINE_COLOR = "#D0D0D0"
+_PLACEHOLDER_COLOR = "#F2F2F2"
+_PLACEHOLDER_TEXT_COLOR = "#808080"
+_ERROR_COLOR = "#E04040"
+# Colors of the default table style of python-pptx (Medium Style 2 - Accent 1)
+_TABLE_HEADER_COLOR = "#4472C4"
+# Colors of the even and odd rows, indexed from the header row
+_TABLE_BAND_COLORS = ("#E9EBF5", "#CFD5EA")
+_TABLE_BORDER_COLOR = "#FFFFFF"
+
+# Items drawn on a preview, in inches:
+#   ("box", left, top, width, height, fill, stroke)
+#   ("line", x1, y1, x2, y2, color)
+#   ("text", x, baseline, text, font size, bold, anchor, color)
+#   ("picture", left, top, width, height, source, crop box)
+Item = Tuple[Any, ...]
+
+
+class _Pictures:
+    """
+    Pictures of the previews, read once and resampled once per size.
+    """
+
+    def __init__(self):
+        # key of a source -> path or encoded picture, or None if unreadable
+        self._files: Dict[Any, Any] = {}
+        # key of a source -> size in pixels
+        self._sizes: Dict[Any, Tuple[int, int]] = {}
+        # key of a source, crop box and size -> resampled picture
+        self._thumbnails: Dict[Tuple, Any] = {}
+        # key of a thumbnail -> data URI of its encoding
+        self._uris: Dict[Tuple, str] = {}
+
+    @staticmethod
+    def _key(source: PictureSource) -> Any:
+        path = source_path(source)
+        return path if path is not None else ("id", id(source))
+
+    def _open(self, source: PictureSource) -> Any:
+        from PIL import Image
+
+        key = self._key(source)
+        if key not in self._files:
+            path = source_path(source)
+            try:
+                file = path if path is not None else read_picture_source(source)
+                with Image.open(file if path is not None else BytesIO(file)) as image:
+                    self._sizes[key] = image.size
+            except (OSError, TypeError, ValueError):
+                file = None
+            # In-memory sources are kept along with their key, so that their
+            # id is not reused by another source
+            self._files[key] = file if path is not None else (file, source)
+        file = self._files[key]
+        if isinstance(file, tuple):
+            file = file[0] and BytesIO(file[0])
+        return file and Image.open(file)
+
+    def size(self, source: PictureSource) -> Optional[Tuple[int, int]]:
+        """
+        Return the size in pixels of a picture, or None when it can not be
+        read.
+        """
+        key = self._key(source)
+        if key not in self._files:
+            image = self._open(source)
+            if image is not None:
+                image.close()
+        return self._sizes.get(key)
+
+    def thumbnail(
+        self,
+        source: PictureSource,
+        crop_box: Optional[Tuple[int, int, int, int]],
+        size: Tuple[int, int],
+    ) -> Any:
+        """
+        Return the region `crop_box` of a picture resampled to `size` pixels.
+        """
+        from PIL import Image
+
+        key = (self._key(source), crop_box, size)
+        thumbnail = self._thumbnails.get(key)
+        if thumbnail is not None:
+            return thumbnail
+
+        image = self._open(source)
+        full_width, full_height = image.size
+        box = crop_box or (0, 0, full_width, full_height)
+        # JPEG pictures are only decoded at the smallest scale still larger
+        # than the thumbnail
+        image.draft(
+            image.mode,
+            (
+                size[0] * full_width // (box[2] - box[0]),
+                size[1] * full_height // (box[3] - box[1]),
+            ),
+        )
+        scale_x = image.size[0] / full_width
+        scale_y = image.size[1] / full_height
+        box = (box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y)
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        thumbnail = image.resize(
+            size, Image.Resampling.BILINEAR, box=box, reducing_gap=2.0
+        )
+        self._thumbnails[key] = thumbnail
+        return thumbnail
+
+    def data_uri(
+        self,
+        source: PictureSource,
+        crop_box: Optional[Tuple[int, int, int, int]],
+        size: Tuple[int, int],
+    ) -> str:
+        """
+        Return a thumbnail as a data URI, in JPEG or in PNG when it has
+        transparency.
+        """
+        key = (self._key(source), crop_box, size)
+        uri = self._uris.get(key)
+        if uri is None:
+            thumbnail = self.thumbnail(source, crop_box, size)
+            output = BytesIO()
+            if thumbnail.mode == "RGBA":
+                thumbnail.save(output, format="PNG")
+                mime_type = "image/png"
+            else:
+                thumbnail.save(output, format="JPEG", quality=80)
+                mime_type = "image/jpeg"
+            encoded = base64.b64encode(output.getvalue()).decode("ascii")
+            uri = self._uris[key] = f"data:{mime_type};base64,{encoded}"
+        return uri
+
+
+class _Drawing:
+    """
+    Items of the preview of a slide.
+    """
+
+    def __init__(self):
+        self.items: List[Item] = []
+
+    def box(
+        self,
+        left: float,
+        top: float,
+        width: float,
+        height: float,
+        fill: Optional[str] = None,
+        stroke: Optional[str] = None,
+    ) -> None:
+        self.items.append(("box", left, top, width, height, fill, stroke))
+
+    def placeholder(
+        self,
+        left: float,
+        top: float,
+        width: float,
+        height: float,
+        label: str,
+        color: str = _PLACEHOLDER_TEXT_COLOR,
+    ) -> None:
+        """
+        Draw a crossed box labelled with `label`, for contents not previewed.
+        """
+        self.box(left, top, width, height, _PLACEHOLDER_COLOR, color)
+        self.items.append(("line", left, top, left + width, top + height, color))
+        self.items.append(("line", left, top + height, left + width, top, color))
+        self.text_lines(
+            [label], left, top + height / 2, width, _FONT_SIZE, "center", color=color
+        )
+
+    def text_lines(
+        self,
+        lines: List[str],
+        left: float,
+        top: float,
+        width: float,
+        font_size: float,
+        alignment: str = "left",
+        bold: bool = False,
+        color: str = _TEXT_COLOR,
+        line_height: float = _LINE_HEIGHT,
+    ) -> None:
+        """
+        Draw lines of text in a box of `width` starting at `top`, inside the
+        insets of textboxes.
+        """
+        if alignment == "center":
+            x, anchor = left + width / 2, "middle"
+        elif alignment == "right":
+            x, anchor = left + width - _TEXT_INSET_X, "end"
+        else:
+            x, anchor = left + _TEXT_INSET_X, "start"
+        baseline = top + _TEXT_INSET_Y + font_size
+        for line in lines:
+            if line:
+                self.items.append(
+                    ("text", x, baseline, line, font_size, bold, anchor, color)
+                )
+            baseline += font_size * line_height
+
+
+def _truncate(text: str, width: float, font_size: float) -> str:
+    n_chars = max(1, int((width - 2 * _TEXT_INSET_X) / (font_size * _CHAR_WIDTH)))
+    text = text.split("\n", 1)[0]
+    return text if len(text) <= n_chars else text[: max(1, n_chars - 3)] + "..."
+
+
+class _SlidePreviews:
+    """
+    Lays out the previews of the slides of a presentation, the same way they
+    are compiled.
+    """
+
+    def __init__(self, presentation: Presentation, pictures: _Pictures):
+        self.presentation = presentation
+        self.pictures = pictures
+        # rect -> remaining rows and header of a table continued on next slides
+        self._table_continuations: Dict[Rect, Tuple[Iterator, List[str]]] = {}
+        # rect -> remaining text continued on next slides
+        self._text_continuations: Dict[Rect, str] = {}
+        self.text_fitter = text_fitter(
+            config["text_font_path"],
+            config["text_font_size"],
+            config["text_min_font_size"],
+        )
+
+    def draw_title(self, drawing: _Drawing, title: str) -> None:
+        # Titles are not wrapped, like the title textboxes
+        drawing.text_lines(
+            title.split("\n"),
+            config["slide_title_left_margin"],
+            config["slide_title_top_margin"],
+            self.presentation.presentation_width
+            - config["slide_title_left_margin"]
+            - config["slide_title_right_margin"],
+            config["slide_title_font_size"],
+            bold=True,
+        )
+
+    def draw_picture(self, drawing: _Drawing, rect: Rect) -> None:
+        left, top = rect.left_inch, rect.top_inch
+        width, height = rect.width_inch, rect.height_inch
+        source = rect.content["picture_source"]
+        size = self.pictures.size(source)
+        if size is None:
+            path = source_path(source)
+            label = os.path.basename(path) if path is not None else "picture"
+            drawing.placeholder(
+                left, top, width, height, f"{label} not readable", _ERROR_COLOR
+            )
+            return
+
+        crop_box = None
+        size_mode = rect.content["picture_size_mode"]
+        if size_mode == "cover":
+            crop_box = calculate_cover_crop_box(size, width, height)
+        elif size_mode == "fit":
+            # Same sizes as `Presentation.compile_picture`, where the picture
+            # is scaled along the smaller side of the rect
+            if width < height:
+                width = size[0] * height / size[1]
+            elif width > height:
+                height = size[1] * width / size[0]
+        drawing.items.append(("picture", left, top, width, height, source, crop_box))
+
+    def draw_text_page(self, drawing: _Drawing, rect: Rect, text: str) -> None:
+        """
+        Draw the text of a rect, fitted like in `Presentation.compile_text_page`.
+        """
+        fitter = self.text_fitter
+        font_size = _FONT_SIZE
+        if rect.content["text_fit"] == "shrink":
+            font_size = fitter.shrink(text, rect.width_inch, rect.height_inch)
+        elif rect.content["text_fit"] == "paginate":
+            font_size = fitter.font_size
+            text, remaining_text = fitter.split(text, rect.width_inch, rect.height_inch)
+            if remaining_text is not None:
+                self._text_continuations[rect] = remaining_text
+
+        lines = fitter.wrap(text, rect.width_inch, font_size)
+        drawing.text_lines(
+            [text[start:end] for start, end in lines],
+            rect.left_inch,
+            rect.top_inch,
+            rect.width_inch,
+            font_size,
+            rect.content["horizontal_alignment"],
+            line_height=fitter.metrics.line_height,
+        )
+
+    def draw_markdown(self, drawing: _Drawing, rect: Rect) -> None:
+        """
+        Draw the Markdown of a rect as plain text, with its list markers.
+        """
+        fitter = self.text_fitter
+        text = markdown_plain_text(parse_markdown(rect.content["markdown"]))
+        font_size = _FONT_SIZE
+        if rect.content["text_fit"] == "shrink":
+            font_size = fitter.shrink(text, rect.width_inch, rect.height_inch)
+
+        lines = fitter.wrap(text, rect.width_inch, font_size)
+        drawing.text_lines(
+            [text[start:end] for start, end in lines],
+            rect.left_inch,
+            rect.top_inch,
+            rect.width_inch,
+            font_size,
+            line_height=fitter.metrics.line_height,
+        )
+
+    def draw_table(self, drawing: _Drawing, rect: Rect) -> None:
+        table_data = rect.content["table_data"]
+        is_sequence = hasattr(table_data, "__len__") or hasattr(table_data, "columns")
+        if not is_sequence:
+            # Iterators of rows are only consumed when compiling
+            drawing.placeholder(
+                rect.left_inch,
+                rect.top_inch,
+                rect.width_inch,
+                rect.height_inch,
+                "table",
+            )
+            return
+        self.draw_table_page(drawing, rect, iter_table_rows(table_data))
+
+    def draw_table_page(
+        self,
+        drawing: _Drawing,
+        rect: Rect,
+        rows: Iterator[List[str]],
+        header: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Draw the rows of a table fitting in the rect, like
+        `Presentation.compile_table_page`.
+        """
+        stretch = rect.content["table_size_mode"] == "stretch"
+        table_height = rect.height_inch if stretch else 0.0
+
+        if rect.content["table_paginate"]:
+            rows_per_page = max(1, int(rect.height_inch // config["table_row_height"]))
+            page_header = [] if header is None else [header]
+            page, remaining_rows = take_rows(
+                rows, max(1, rows_per_page - len(page_header))
+            )
+            page = page_header + page
+            table_height = table_height * len(page) / rows_per_page
+
+            if remaining_rows is not None:
+                if header is None and rect.content["table_repeat_header"]:
+                    header = page[0]
+                self._table_continuations[rect] = (remaining_rows, header)
+        else:
+            page = list(rows)
+        if not page:
+            return
+
+        n_cols = len(page[0]) or 1
+        col_width = rect.width_inch / n_cols
+        row_height = table_height / len(page) if stretch else _ROW_HEIGHT
+        top = rect.top_inch
+        for row_idx, row in enumerate(page):
+            is_header = row_idx == 0
+            fill = _TABLE_HEADER_COLOR if is_header else _TABLE_BAND_COLORS[row_idx % 2]
+            color = "#FFFFFF" if is_header else _TEXT_COLOR
+            for col_idx in range(n_cols):
+                left = rect.left_inch + col_idx * col_width
+                drawing.box(left, top, col_width, row_height, fill, _TABLE_BORDER_COLOR)
+                if col_idx < len(row):
+                    drawing.text_lines(
+                        [_truncate(row[col_idx], col_width, _FONT_SIZE)],
+                        left,
+                        top,
+                        col_width,
+                        _FONT_SIZE,
+                        bold=is_header,
+                        color=color,
+                    )
+            top += row_height
+
+    def draw_rect(self, drawing: _Drawing, rect: Rect) -> None:
+        content_type = rect.content["type"]
+        # The outline is the rect before its margins
+        drawing.box(*rect._outer_inches, stroke=_OUTLINE_COLOR)
+        if content_type is None:
+            return
+
+        rect.apply_margin()
+        if content_type == "picture":
+            self.draw_picture(drawing, rect)
+        elif content_type == "text" and isinstance(rect.content["text"], str):
+            self.draw_text_page(drawing, rect, rect.content["text"])
+        elif content_type == "markdown" and isinstance(rect.content["markdown"], str):
+            self.draw_markdown(drawing, rect)
+        elif content_type == "table":
+            self.draw_table(drawing, rect)
+        else:
+            if content_type == "figure":
+                func = rect.content["figure"][0]
+                label = f"{getattr(func, '__name__', 'figure')}()"
+            elif content_type == "object":
+                label = type(rect.content["object"]).__name__
+            else:
+                label = str(content_type)
+            drawing.placeholder(
+                rect.left_inch,
+                rect.top_inch,
+                rect.width_inch,
+                rect.height_inch,
+                label,
+            )
+
+    def iter_drawings(self, slides: List[Slide]) -> Iterator[_Drawing]:
+        """
+        Lay out the previews of `slides`, and of their continuation slides.
+        """
+        self.presentation.calculate_geometry(slides)
+        for slide in slides:
+            drawing = _Drawing()
+            if slide.title:
+                self.draw_title(drawing, slide.title)
+            for rect in slide.rects.values():
+                self.draw_rect(drawing, rect)
+            yield drawing
+
+            while self._table_continuations or self._text_continuations:
+                drawing = _Drawing()
+                if slide.title:
+                    self.draw_title(drawing, slide.title)
+                table_continuations = self._table_continuations
+                text_continuations = self._text_continuations
+                self._table_continuations = {}
+                self._text_continuations = {}
+                for rect, (rows, header) in table_continuations.items():
+                    self.draw_table_page(drawing, rect, rows, header)
+                for rect, text in text_continuations.items():
+                    self.draw_text_page(drawing, rect, text)
+                yield drawing
+
+
+def _pixels(inches: float, dpi: float) -> int:
+    return max(1, round(inches * dpi))
+
+
+def _to_svg(
+    drawing: _Drawing,
+    width: float,
+    height: float,
+    dpi: float,
+    pictures: Optional[_Pictures],
+) -> bytes:
+    # Items are drawn in inches, which are scaled to `dpi` by the view box
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg"'
+        f' width="{_pixels(width, dpi)}" height="{_pixels(height, dpi)}"'
+        f' viewBox="0 0 {width:g} {height:g}"'
+        f' font-family="{_FONT_FAMILY}" stroke-width="0.01">',
+        f'<rect width="{width:g}" height="{height:g}" fill="#FFFFFF"/>',
+    ]
+    for item in drawing.items:
+        kind = item[0]
+        if kind == "box":
+            _, left, top, box_width, box_height, fill, stroke = item
+            parts.append(
+                f'<rect x="{left:.4f}" y="{top:.4f}" width="{box_width:.4f}"'
+                f' height="{box_height:.4f}" fill="{fill or "none"}"'
+                f' stroke="{stroke or "none"}"/>'
+            )
+        elif kind == "line":
+            _, x1, y1, x2, y2, color = item
+            parts.append(
+                f'<line x1="{x1:.4f}" y1="{y1:.4f}" x2="{x2:.4f}" y2="{y2:.4f}"'
+                f' stroke="{color}"/>'
+            )
+        elif kind == "text":
+            _, x, baseline, text, font_size, bold, anchor, color = item
+            weight = ' font-weight="bold"' if bold else ""
+            parts.append(
+                f'<text x="{x:.4f}" y="{baseline:.4f}" font-size="{font_size:.4f}"'
+                f' text-anchor="{anchor}" fill="{color}"{weight}>{escape(text)}</text>'
+            )
+        elif kind == "picture":
+            _, left, top, box_width, box_height, source, crop_box = item
+            geometry = (
+                f'x="{left:.4f}" y="{top:.4f}" width="{box_width:.4f}"'
+                f' height="{box_height:.4f}"'
+            )
+            if pictures is None:
+                parts.append(
+                    f'<rect {geometry} fill="{_PLACEHOLDER_COLOR}"'
+                    f' stroke="{_PLACEHOLDER_TEXT_COLOR}"/>'
+                )
+                continue
+            size = (_pixels(box_width, dpi), _pixels(box_height, dpi))
+            uri = pictures.data_uri(source, crop_box, size)
+            parts.append(f'<image {geometry} preserveAspectRatio="none" href="{uri}"/>')
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def _to_png(
+    drawing: _Drawing,
+    width: float,
+    height: float,
+    dpi: float,
+    pictures: Optional[_Pictures],
+) -> bytes:
+    from PIL import Image, ImageDraw, ImageFont
+
+    image = Image.new("RGB", (_pixels(width, dpi), _pixels(height, dpi)), "#FFFFFF")
+    draw = ImageDraw.Draw(image)
+    fonts: Dict[int, Any] = {}
+    for item in drawing.items:
+        kind = item[0]
+        if kind == "box":
+            _, left, top, box_width, box_height, fill, stroke = item
+            draw.rectangle(
+                (
+                    round(left * dpi),
+                    round(top * dpi),
+                    round((left + box_width) * dpi) - 1,
+                    round((top + box_height) * dpi) - 1,
+                ),
+                fill=fill,
+                outline=stroke,
+            )
+        elif kind == "line":
+            _, x1, y1, x2, y2, color = item
+            draw.line((x1 * dpi, y1 * dpi, x2 * dpi, y2 * dpi), fill=color)
+        elif kind == "text":
+            _, x, baseline, text, font_size, bold, anchor, color = item
+            size = _pixels(font_size, dpi)
+            font = fonts.get(size)
+            if font is None:
+                font = fonts[size] = ImageFont.load_default(size)
+            # Without FreeType, the bitmap font is only anchored at its top left
+            position = (x * dpi, baseline * dpi)
+            if not isinstance(font, ImageFont.FreeTypeFont):
+                offset = {"start": 0, "middle": 0.5, "end": 1}[anchor]
+                position = (
+                    position[0] - draw.textlength(text, font=font) * offset,
+                    position[1] - size,
+                )
+                draw.text(position, text, fill=color, font=font)
+                continue
+            draw.text(
+                position,
+                text,
+                fill=color,
+                font=font,
+                anchor={"start": "ls", "middle": "ms", "end": "rs"}[anchor],
+                stroke_width=1 if bold and size >= 12 else 0,
+                stroke_fill=color,
+            )
+        elif kind == "picture":
+            _, left, top, box_width, box_height, source, crop_box = item
+            position = (round(left * dpi), round(top * dpi))
+            size = (_pixels(box_width, dpi), _pixels(box_height, dpi))
+            if pictures is None:
+                draw.rectangle(
+                    (*position, position[0] + size[0] - 1, position[1] + size[1] - 1),
+                    fill=_PLACEHOLDER_COLOR,
+                    outline=_PLACEHOLDER_TEXT_COLOR,
+                )
+                continue
+            thumbnail = pictures.thumbnail(source, crop_box, size)
+            image.paste(
+                thumbnail, position, thumbnail if thumbnail.mode == "RGBA" else None
+            )
+
+    output = BytesIO()
+    image.save(output, format="PNG", compress_level=1)
+    return output.getvalue()
+
+
+def render_previews(
+    presentation: Presentation,
+    format: str = "svg",
+    dpi: float = 48,
+    pictures: bool = True,
+) -> Iterator[bytes]:
+    """
+    Render a preview of each slide of `presentation`, followed by its
+    continuation slides, as SVG or PNG pictures of `dpi` pixels per inch.
+    Without `pictures`, pictures are drawn as boxes, and only their headers
+    are read to place them.
+    """
+    if format not in _FORMATS:
+        raise ValueError(
+            f"Unknown preview format: {format}"
+            + f"\nAvailable formats: {', '.join(_FORMATS)}"
+        )
+    render = _to_svg if format == "svg" else _to_png
+    picture_reader = _Pictures()
+    previews = _SlidePreviews(presentation, picture_reader)
+    for drawing in previews.iter_drawings(presentation.slides):
+        yield render(
+            drawing,
+            presentation.presentation_width,
+            presentation.presentation_height,
+            dpi,
+            picture_reader if pictures else None,
+        )
+
+
+def save_previews(
+    presentation: Presentation,
+    directory: str,
+    format: str = "svg",
+    dpi: float = 48,
+    pictures: bool = True,
+) -> List[str]:
+    """
+    Save the previews of `render_previews` to `directory`, named like the
+    slides of the deck (slide1.svg, slide2.svg...). Return their paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    previews = render_previews(presentation, format, dpi, pictures)
+    for number, preview in enumerate(previews, start=1):
+        path = os.path.join(directory, f"slide{number}.{format}")
+        with open(path, "wb") as file:
+            file.write(preview)
+        paths.append(path)
+    return paths
@@ -0,0 +1,152 @@
+"""
+Opt-in instrumentation of the compilation phases.
+
+While a `Profiler` is active, mozaik records the wall time, number of calls and
+bytes processed by each phase:
+
+- layout: parsing the layout mosaic of a slide
+- geometry: calculating the position and size of the rects in inches
+- pictures: preparing the pictures to embed
+- figures: rendering the figures missing from the figure cache
+- picture, figure, text, table, object: building the shapes of each content type
+- slide: building a whole slide
+- compile, serialize: compiling the presentation and writing the ZIP package
+
+```python
+with Profiler(callback=print) as profiler:
+    presentation.save("deck.pptx")
+print(profiler.report())
+```
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Callable, Dict, Optional, Tuple
+
+# Called with the phase name, its wall time in seconds and the bytes processed
+PhaseCallback = Callable[[str, float, int], None]
+
+
+class PhaseStats:
+    """
+    Accumulated measurements of a phase.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __repr__(self) -> str:
+        return f"calls={self.calls}, seconds={self.seconds:.6f}, bytes={self.bytes}"
+
+
+class Profiler:
+    """
+    Collects the measurements of every phase run while the profiler is active.
+    Each measurement is also passed to `callback`, e.g. to forward it to a
+    metrics system.
+
+    A profiler is active in the context it was entered in, so it only measures
+    the compilations of its thread, or of its task and the compilations the
+    task runs on an executor with `mozaik.aio`.
+    """
+
+    def __init__(self, callback: Optional[PhaseCallback] = None):
+        self.callback = callback
+        self.stats: Dict[str, PhaseStats] = {}
+        # Compilations of concurrent tasks can record at the same time
+        self._lock = threading.Lock()
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> Profiler:
+        self._token = _active_profilers.set(_active_profilers.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _active_profilers.reset(self._token)
+        self._token = None
+
+    def record(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = PhaseStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.bytes += nbytes
+        if self.callback is not None:
+            self.callback(name, seconds, nbytes)
+
+    def report(self) -> str:
+        """
+        Format the stats as a table, slowest phases first.
+        """
+        lines = [f"{'phase':<12}{'calls':>10}{'seconds':>12}{'bytes':>14}"]
+        ordered = sorted(self.stats.items(), key=lambda item: -item[1].seconds)
+        for name, stats in ordered:
+            lines.append(
+                f"{name:<12}{stats.calls:>10}{stats.seconds:>12.4f}{stats.bytes:>14}"
+            )
+        return "\n".join(lines)
+
+
+# Profilers of the current context, and the phases it is measuring (innermost
+# last), so that concurrent compilations are measured separately
+_active_profilers: ContextVar[Tuple[Profiler, ...]] = ContextVar(
+    "mozaik_active_profilers", default=()
+)
+_open_phases: ContextVar[Tuple[_Phase, ...]] = ContextVar(
+    "mozaik_open_phases", default=()
+)
+
+
+class _Phase:
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes = 0
+        self.start = 0.0
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> _Phase:
+        self._token = _open_phases.set(_open_phases.get() + (self,))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.start
+        _open_phases.reset(self._token)
+        for profiler in _active_profilers.get():
+            profiler.record(self.name, seconds, self.bytes)
+
+
+class _NoPhase:
+    def __enter__(self) -> _NoPhase:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """
+    Measure the phase `name` in a `with` block. Nothing is measured when no
+    profiler is active.
+    """
+    if not _active_profilers.get():
+        return _NO_PHASE
+    return _Phase(name)
+
+
+def add_bytes(nbytes: int) -> None:
+    """
+    Add to the bytes processed by the innermost phase being measured.
+    """
+    open_phases = _open_phases.get()
+    if open_phases:
+        open_phases[-1].bytes += nbytes
@@ -1,29 +1,112 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from mozaik.objects.base_object import BaseObject
+from mozaik.picture.picture_source import PictureSource
+from mozaik.profiling import phase
 
+if TYPE_CHECKING:
+    from mozaik.template import SlideTemplate
 
-def _check_bounds_validity(bounds: List[Rect]) -> None:
-    for bound in bounds:
-        if bound.width < 1 or bound.height < 1:
-            raise ValueError(f"Invalid bounds: {bound}")
 
-    # check if all bounds are not intersecting
-    for bound in bounds:
-        for other_bound in bounds:
-            if bound == other_bound:
+# Parsed layout: number of rows, number of columns, and the bounds of each
+# region as (char, left, top, width, height) in tiles.
+Layout = Tuple[int, int, Tuple[Tuple[str, int, int, int, int], ...]]
+
+
+@lru_cache(maxsize=256)
+def _parse_layout(layout_mosaic: str) -> Layout:
+    """
+    Parse a layout mosaic in a single pass over its tiles, then check that each
+    region exactly fills its bounding box. Results are memoized by mosaic.
+    """
+    # The rows of the mosaic form the occupancy grid, where whitespace marks
+    # empty tiles.
+    rows = [row.strip() for row in layout_mosaic.strip().split("\n")]
+    n_rows = len(rows)
+    n_cols = max([len(row) for row in rows])
+
+    # char -> [min row, max row, min col, max col, number of tiles]
+    bounds: Dict[str, List[int]] = {}
+    for row_index, row in enumerate(rows):
+        for col_index, char in enumerate(row):
+            if char.isspace():
+                continue
+            bound = bounds.get(char)
+            if bound is None:
+                bounds[char] = [row_index, row_index, col_index, col_index, 1]
                 continue
-            if (
-                bound.left < other_bound.left
-                and bound.top < other_bound.top
-                and bound.left + bound.width > other_bound.left
-                and bound.top + bound.height > other_bound.top
-            ):
-                raise Exception(
-                    f"Intersecting bounds detected: {bound.char} and {other_bound.char}"
-                )
+            bound[0] = min(bound[0], row_index)
+            bound[1] = max(bound[1], row_index)
+            bound[2] = min(bound[2], col_index)
+            bound[3] = max(bound[3], col_index)
+            bound[4] += 1
+
+    regions = []
+    for char, (min_row, max_row, min_col, max_col, n_tiles) in bounds.items():
+        width = max_col - min_col + 1
+        height = max_row - min_row + 1
+
+        # A rectangular region owns every tile of its bounding box. Otherwise
+        # the box is shared with other regions or contains empty tiles.
+        if n_tiles != width * height:
+            intruders = set()
+            for row in rows[min_row : max_row + 1]:
+                for tile in row[min_col : max_col + 1].ljust(width):
+                    if tile != char:
+                        intruders.add("empty tiles" if tile.isspace() else repr(tile))
+            raise ValueError(
+                f"Region {char!r} is not a rectangle: its bounding box "
+                f"(rows {min_row}-{max_row}, columns {min_col}-{max_col}) "
+                f"has {n_tiles} of {width * height} tiles"
+                + f"\nOther tiles in the bounding box: {', '.join(sorted(intruders))}"
+            )
+
+        regions.append((char, min_col, min_row, width, height))
+
+    return n_rows, n_cols, tuple(regions)
+
+
+def _outer_inches(
+    rect: Rect,
+    slide: Slide,
+    presentation_width: float,
+    slide_content_height: float,
+    config: Dict[str, Any],
+) -> Tuple[float, float, float, float]:
+    """
+    Return the position and size in inches of a rect, before applying its
+    margins.
+    """
+    left_inch = rect.left / slide.n_cols * presentation_width
+    top_inch = rect.top / slide.n_rows * slide_content_height
+    width_inch = rect.width / slide.n_cols * presentation_width
+    height_inch = rect.height / slide.n_rows * slide_content_height
+
+    left_inch += config["slide_left_padding"]
+    top_inch += config["slide_top_padding"]
+    width_inch -= config["slide_left_padding"] + config["slide_right_padding"]
+    height_inch -= config["slide_top_padding"] + config["slide_bottom_padding"]
+
+    if slide.title:
+        # shift top_inch by title height
+        top_inch += config["slide_title_font_size"]
+        top_inch += config["slide_title_top_margin"]
+        top_inch += config["slide_title_bottom_margin"]
+
+    return left_inch, top_inch, width_inch, height_inch
 
 
 class Rect:
@@ -32,6 +115,26 @@ class Rect:
     content in the slide.
     """
 
+    # Decks hold many rects, which are kept small without an instance dict
+    __slots__ = (
+        "char",
+        "left",
+        "top",
+        "width",
+        "height",
+        "left_inch",
+        "top_inch",
+        "width_inch",
+        "height_inch",
+        "left_margin",
+        "top_margin",
+        "right_margin",
+        "bottom_margin",
+        "_outer_inches",
+        "content",
+        "version",
+    )
+
     def __init__(
         self,
         char: str,
@@ -57,8 +160,13 @@ class Rect:
         self.top_margin = top_margin
         self.right_margin = right_margin
         self.bottom_margin = bottom_margin
+        # Position and size in inches before applying the margins
+        self._outer_inches: Tuple[float, float, float, float] = None
 
         self.content: Dict[str, Any] = {"type": None}
+        # Incremented on every change, so that presentations only recompile
+        # the slides which changed.
+        self.version = 0
 
     def __repr__(self) -> str:
         return f"{self.char}: {self.left}, {self.top}, {self.width}, {self.height}"
@@ -73,37 +181,52 @@ class Rect:
         """
         Calculate the position and size of the rect in inches.
         """
-        self.left_inch = self.left / slide.n_cols * presentation_width
-        self.top_inch = self.top / slide.n_rows * slide_content_height
-        self.width_inch = self.width / slide.n_cols * presentation_width
-        self.height_inch = self.height / slide.n_rows * slide_content_height
-
-        self.left_inch += config["slide_left_padding"]
-        self.top_inch += config["slide_top_padding"]
-        self.width_inch -= config["slide_left_padding"] + config["slide_right_padding"]
-        self.height_inch -= config["slide_top_padding"] + config["slide_bottom_padding"]
+        self.set_outer_inches(
+            _outer_inches(self, slide, presentation_width, slide_content_height, config)
+        )
 
-        if slide.title:
-            # shift top_inch by title height
-            self.top_inch += config["slide_title_font_size"]
-            self.top_inch += config["slide_title_top_margin"]
-            self.top_inch += config["slide_title_bottom_margin"]
+    def set_outer_inches(self, inches: Tuple[float, float, float, float]) -> None:
+        """
+        Set the position and size of the rect in inches, before applying its
+        margins.
+        """
+        self._outer_inches = inches
+        self.left_inch, self.top_inch, self.width_inch, self.height_inch = inches
 
     def apply_margin(self) -> None:
-        self.left_inch += self.left_margin
-        self.top_inch += self.top_margin
-        self.width_inch -= self.left_margin + self.right_margin
-        self.height_inch -= self.top_margin + self.bottom_margin
+        """
+        Shrink the rect by its margins. The margins are always applied to the
+        position and size calculated by `calculate_inches`, so applying them
+        more than once has no further effect.
+        """
+        left_inch, top_inch, width_inch, height_inch = self._outer_inches
+        self.left_inch = left_inch + self.left_margin
+        self.top_inch = top_inch + self.top_margin
+        self.width_inch = width_inch - (self.left_margin + self.right_margin)
+        self.height_inch = height_inch - (self.top_margin + self.bottom_margin)
+
+    def mark_dirty(self) -> None:
+        """
+        Mark the rect as changed. Setting the content does it automatically,
+        other changes (like margins) must be marked explicitly.
+        """
+        self.version += 1
 
     def set_picture(
         self,
-        path: str,
+        source: PictureSource,
         size_mode: str = "cover",
         picture_width: Optional[float] = None,
         picture_height: Optional[float] = None,
     ) -> None:
+        """
+        Set a picture, from a path or in memory: encoded bytes, a buffer, a
+        binary file-like object, an image array or a matplotlib figure.
+        In-memory pictures are read, encoded or rendered at compile time.
+        """
+        self.mark_dirty()
         self.content["type"] = "picture"
-        self.content["picture_path"] = path
+        self.content["picture_source"] = source
         self.content["picture_size_mode"] = size_mode
         self.content["picture_width"] = self.width_inch
         self.content["picture_height"] = self.height_inch
@@ -112,17 +235,63 @@ class Rect:
         if picture_height is not None:
             self.content["picture_height"] = picture_height
 
-    def set_text(self, text: str, horizontal_alignment: str = "left") -> None:
+    def set_figure(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """
+        Set a figure, rendered at compile time by calling `func(*args, **kwargs)`,
+        which returns a matplotlib figure. The figure is resized to the rect, and
+        its rendering is cached by the hash of `func` and its arguments.
+        """
+        self.mark_dirty()
+        self.content["type"] = "figure"
+        self.content["figure"] = (func, args, kwargs)
+
+    def set_text(
+        self, text: str, horizontal_alignment: str = "left", fit: Optional[str] = None
+    ) -> None:
+        """
+        Set a text. With `fit`, the text is measured against the rect: "shrink"
+        uses the largest font size at which it fits, and "paginate" continues
+        the lines overflowing the rect on the next slides.
+        """
+        self.mark_dirty()
         self.content["type"] = "text"
         self.content["text"] = text
         self.content["horizontal_alignment"] = horizontal_alignment
+        self.content["text_fit"] = fit
+
+    def set_markdown(self, text: str, fit: Optional[str] = None) -> None:
+        """
+        Set a Markdown text, with its headings, lists, code blocks, emphasis
+        and links. With `fit="shrink"`, the text uses the largest font size at
+        which it fits the rect.
+        """
+        self.mark_dirty()
+        self.content["type"] = "markdown"
+        self.content["markdown"] = text
+        self.content["text_fit"] = fit
 
-    def set_table(self, table_data: List[List[str]], size_mode: str = "auto") -> None:
+    def set_table(
+        self,
+        table_data: Iterable[Sequence[Any]],
+        size_mode: str = "auto",
+        paginate: bool = False,
+        repeat_header: bool = True,
+    ) -> None:
+        """
+        Set a table, from rows of cells, a 2D NumPy array or a DataFrame-like
+        object. Rows are consumed lazily at compile time. With `paginate`, rows
+        overflowing the rect continue on the next slides, which repeat the
+        header row if `repeat_header` is set.
+        """
+        self.mark_dirty()
         self.content["type"] = "table"
         self.content["table_data"] = table_data
         self.content["table_size_mode"] = size_mode
+        self.content["table_paginate"] = paginate
+        self.content["table_repeat_header"] = repeat_header
 
     def set_object(self, obj: BaseObject) -> None:
+        self.mark_dirty()
         self.content["type"] = "object"
         self.content["object"] = obj
 
@@ -134,45 +303,44 @@ class Slide:
 
     def __init__(self, layout_mosaic: str, title: Optional[str] = None):
         self.layout_mosaic = layout_mosaic
-        self.title = title
+        self._title = title
+        self._version = 0
         self.rects: Dict[str, Rect] = dict()
         self.n_rows: int = None
         self.n_cols: int = None
+        # Set on the slides created by `SlideTemplate.instantiate`
+        self.template: Optional[SlideTemplate] = None
 
         self._populate_rects()
-        _check_bounds_validity(self.rects.values())
 
     def __getitem__(self, char: str) -> Rect:
         return self.rects[char]
 
+    @property
+    def title(self) -> Optional[str]:
+        return self._title
+
+    @title.setter
+    def title(self, title: Optional[str]) -> None:
+        self._title = title
+        self.mark_dirty()
+
+    @property
+    def version(self) -> int:
+        """
+        Number of changes of the slide and its rects. It only grows, so a
+        presentation knows a slide changed when its version differs.
+        """
+        return self._version + sum(rect.version for rect in self.rects.values())
+
+    def mark_dirty(self) -> None:
+        """
+        Mark the slide as changed, to compile it again on the next save.
+        """
+        self._version += 1
+
     def _populate_rects(self) -> None:
-        rows = [row.strip() for row in self.layout_mosaic.strip().split("\n")]
-        self.n_rows = len(rows)
-        self.n_cols = max([len(row) for row in rows])
-
-        # Get unique non whitespace characters
-        unique_chars = set(self.layout_mosaic.replace(" ", ""))
-        if "\n" in unique_chars:
-            unique_chars.remove("\n")
-
-        for current_char in unique_chars:
-            min_row_index = len(rows)
-            max_row_index = 0
-            min_col_index = len(rows[0])
-            max_col_index = 0
-            for row_index, row in enumerate(rows):
-                # get index of current char
-                for col_index, char in enumerate(row):
-                    if char == current_char:
-                        min_row_index = min(min_row_index, row_index)
-                        max_row_index = max(max_row_index, row_index)
-                        min_col_index = min(min_col_index, col_index)
-                        max_col_index = max(max_col_index, col_index)
-
-            self.rects[current_char] = Rect(
-                current_char,
-                min_col_index,
-                min_row_index,
-                max_col_index - min_col_index + 1,
-                max_row_index - min_row_index + 1,
-            )
+        with phase("layout"):
+            self.n_rows, self.n_cols, regions = _parse_layout(self.layout_mosaic)
+            for char, left, top, width, height in regions:
+                self.rects[char] = Rect(char, left, top, width, height)
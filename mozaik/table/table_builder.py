@@ -0,0 +1,102 @@
+"""
+Bulk construction of table rows.
+
+The rows of a table are rendered to XML in one go and parsed once, instead of
+setting the text of each cell through python-pptx. Table data is consumed as a
+stream of rows, so large sources are never converted to lists as a whole.
+"""
+import re
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls
+
+from ..profiling import add_bytes
+
+# Characters not allowed in XML are escaped the same way python-pptx does
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def iter_table_rows(table_data: Any) -> Iterator[List[str]]:
+    """
+    Iterate over the rows of `table_data` as lists of strings. Supports
+    sequences and iterators of rows, 2D NumPy arrays, and DataFrame-like objects
+    (having `columns` and `itertuples`), whose column names form the first row.
+    """
+    if hasattr(table_data, "columns") and hasattr(table_data, "itertuples"):
+        rows = chain(
+            [table_data.columns], table_data.itertuples(index=False, name=None)
+        )
+    elif getattr(table_data, "ndim", None) == 2:
+        # Rows of NumPy arrays are converted to Python values one at a time
+        rows = (row.tolist() for row in table_data)
+    else:
+        rows = iter(table_data)
+
+    for row in rows:
+        yield [cell if isinstance(cell, str) else str(cell) for cell in row]
+
+
+def take_rows(
+    rows: Iterator[List[str]], n_rows: int
+) -> Tuple[List[List[str]], Optional[Iterator[List[str]]]]:
+    """
+    Take up to `n_rows` rows from `rows`. Also return the iterator over the
+    remaining rows, or None when there are no rows left.
+    """
+    page = list(islice(rows, n_rows))
+    next_row = next(rows, None)
+    if next_row is None:
+        return page, None
+    return page, chain([next_row], rows)
+
+
+def _cell_xml(text: str) -> str:
+    paragraphs = []
+    for paragraph in text.split("\n"):
+        if not paragraph:
+            paragraphs.append("<a:p/>")
+            continue
+        paragraph = _INVALID_XML_CHARS.sub(
+            lambda match: "_x%04X_" % ord(match.group()), escape(paragraph)
+        )
+        paragraphs.append(f"<a:p><a:r><a:t>{paragraph}</a:t></a:r></a:p>")
+    return (
+        "<a:tc><a:txBody><a:bodyPr/><a:lstStyle/>"
+        + "".join(paragraphs)
+        + "</a:txBody><a:tcPr/></a:tc>"
+    )
+
+
+def fill_table(tbl: Any, rows: Iterable[List[str]], height: int) -> None:
+    """
+    Replace the rows of the `a:tbl` element `tbl` with `rows`, sharing `height`
+    (in EMU) between them.
+    """
+    n_cols = len(tbl.tblGrid.gridCol_lst)
+    rows_xml = []
+    for row_idx, row in enumerate(rows):
+        if len(row) > n_cols:
+            raise ValueError(
+                f"Row {row_idx} of the table has {len(row)} cells"
+                + f"\nThe table has {n_cols} columns"
+            )
+        # Short rows are padded with empty cells
+        cells = "".join(map(_cell_xml, row)) + _cell_xml("") * (n_cols - len(row))
+        rows_xml.append(cells)
+
+    # Same row heights as python-pptx, where the last row absorbs the division
+    # error.
+    row_height = height // len(rows_xml)
+    last_row_height = height - (len(rows_xml) - 1) * row_height
+    trs = [f'<a:tr h="{row_height}">{cells}</a:tr>' for cells in rows_xml[:-1]]
+    trs.append(f'<a:tr h="{last_row_height}">{rows_xml[-1]}</a:tr>')
+
+    tbl_xml = f"<a:tbl {nsdecls('a')}>{''.join(trs)}</a:tbl>"
+    add_bytes(len(tbl_xml))
+
+    for tr in tbl.tr_lst:
+        tbl.remove(tr)
+    tbl.extend(list(parse_xml(tbl_xml)))
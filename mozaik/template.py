@@ -0,0 +1,263 @@
+"""
+Slide templates, to build many slides sharing the same layout and content
+types, where only the values change.
+
+The first instance of a template in a presentation is compiled as usual and
+its shapes are kept. Every later instance is stamped out by cloning these
+shapes and substituting the values.
+"""
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.shapes.shapetree import SlideShapeFactory
+
+from .picture.picture_source import source_path
+from .profiling import phase
+from .slide import Rect, Slide
+from .table.table_builder import fill_table, iter_table_rows
+
+# Key of the value of each content type in `Rect.content`
+_VALUE_KEYS = {
+    "picture": "picture_source",
+    "text": "text",
+    "markdown": "markdown",
+    "table": "table_data",
+    "object": "object",
+}
+
+# Offset of a shape in the slide, for each kind of shape
+_SHAPE_OFFSET_XPATH = (
+    "./p:spPr/a:xfrm/a:off | ./p:grpSpPr/a:xfrm/a:off | ./p:xfrm/a:off"
+)
+
+_RELATIONSHIP_NAMESPACE = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+)
+
+
+class SlideTemplate:
+    """
+    This class represents a slide whose rects only differ by their values
+    across many slides.
+    """
+
+    def __init__(self, slide: Slide):
+        self.slide = slide
+
+    def instantiate(
+        self, values: Optional[Dict[str, Any]] = None, title: Optional[str] = None
+    ) -> Slide:
+        """
+        Create a slide from the template, where `values` maps rect characters
+        to the text, table data, picture source or object of the rect.
+        """
+        if title is None:
+            title = self.slide.title
+        if bool(title) != bool(self.slide.title):
+            raise ValueError(
+                "Instances must have a title if and only if the template has one"
+            )
+
+        slide = Slide(self.slide.layout_mosaic, title=title)
+        slide.template = self
+        for char, rect in slide.rects.items():
+            template_rect = self.slide.rects[char]
+            rect.left_margin = template_rect.left_margin
+            rect.top_margin = template_rect.top_margin
+            rect.right_margin = template_rect.right_margin
+            rect.bottom_margin = template_rect.bottom_margin
+            rect.content = dict(template_rect.content)
+
+        for char, value in (values or {}).items():
+            if char not in slide.rects:
+                raise ValueError(f"Unknown rect: {char}")
+            content = slide.rects[char].content
+            if content["type"] not in _VALUE_KEYS:
+                raise ValueError(f"Rect {char} of the template has no content")
+            content[_VALUE_KEYS[content["type"]]] = value
+
+        return slide
+
+
+def _rect_signature(rect: Rect) -> Optional[Hashable]:
+    """
+    Return what the shapes of a rect depend on, apart from its text values.
+    Rects with the same signature can be stamped from each other. Return None
+    when the shapes of the rect can not be stamped.
+    """
+    content = rect.content
+    margins = (rect.left_margin, rect.top_margin, rect.right_margin, rect.bottom_margin)
+    if content["type"] is None:
+        return (None,)
+    if content["type"] == "text" and content["text_fit"] is None:
+        return ("text", margins, content["horizontal_alignment"])
+    if (
+        content["type"] == "table"
+        and isinstance(content["table_data"], list)
+        and not content["table_paginate"]
+    ):
+        table_shape = tuple(len(row) for row in content["table_data"])
+        return ("table", margins, content["table_size_mode"], table_shape)
+    if content["type"] == "picture" and source_path(content["picture_source"]):
+        # Pictures are only cloned when the same picture file is shown
+        picture = (
+            source_path(content["picture_source"]),
+            content["picture_size_mode"],
+        )
+        return ("picture", margins, picture)
+    if content["type"] == "object":
+        # Objects are only cloned when the very same object is attached
+        return ("object", margins, id(content["object"]))
+    return None
+
+
+def _iter_relationship_attributes(element: Any) -> Iterator[Tuple[Any, str]]:
+    for descendant in element.iter():
+        for attribute in descendant.attrib:
+            if attribute.startswith(_RELATIONSHIP_NAMESPACE):
+                yield descendant, attribute
+
+
+def _related_image_parts(pptx_slide: Any, elements: List[Any]) -> Optional[Dict]:
+    """
+    Return the image parts referred to by the shape elements, by rId. Shapes
+    referring to images are cloned along with a relationship to the same image
+    part. Other relationships (like charts) would share parts that belong to a
+    single slide, so None is returned and these shapes are not cloned.
+    """
+    image_parts = {}
+    for element in elements:
+        for descendant, attribute in _iter_relationship_attributes(element):
+            rId = descendant.get(attribute)
+            relationship = pptx_slide.part.rels[rId]
+            if relationship.reltype != RT.IMAGE:
+                return None
+            image_parts[rId] = relationship.target_part
+    return image_parts
+
+
+def clone_shapes(
+    pptx_slide: Any,
+    elements: List[Any],
+    image_parts: Dict[str, Any],
+    next_shape_id: int,
+    offset: Tuple[int, int] = (0, 0),
+) -> Tuple[List[Any], int]:
+    """
+    Append clones of the shape elements to a slide, moved by `offset` (in
+    EMU), where `image_parts` gives the image part of each rId of the
+    elements. Return the cloned shapes and the next free shape id.
+    """
+    shapes = pptx_slide.shapes
+    clones = []
+    for element in elements:
+        clone = deepcopy(element)
+        # Keep shape ids unique in the slide
+        for c_nv_pr in clone.xpath(".//p:cNvPr"):
+            # python-pptx names shapes after their id, like "TextBox 6"
+            # for id 7
+            name_suffix = f" {int(c_nv_pr.get('id')) - 1}"
+            if c_nv_pr.get("name", "").endswith(name_suffix):
+                name = c_nv_pr.get("name")[: -len(name_suffix)]
+                c_nv_pr.set("name", f"{name} {next_shape_id - 1}")
+            c_nv_pr.set("id", str(next_shape_id))
+            next_shape_id += 1
+        # Relate the slide to the images of the shape
+        for descendant, attribute in _iter_relationship_attributes(clone):
+            image_part = image_parts[descendant.get(attribute)]
+            descendant.set(attribute, pptx_slide.part.relate_to(image_part, RT.IMAGE))
+        if offset != (0, 0):
+            for off in clone.xpath(_SHAPE_OFFSET_XPATH):
+                off.set("x", str(int(off.get("x")) + offset[0]))
+                off.set("y", str(int(off.get("y")) + offset[1]))
+        shapes._spTree.insert_element_before(clone, "p:extLst")
+        clones.append(SlideShapeFactory(clone, shapes))
+    return clones, next_shape_id
+
+
+class PreparedTemplate:
+    """
+    Shapes of a compiled instance of a template, ready to be cloned.
+    """
+
+    def __init__(
+        self,
+        slide: Slide,
+        pptx_slide: Any,
+        title_elements: List[Any],
+        rect_elements: Dict[str, List[Any]],
+    ):
+        self.has_title = bool(slide.title)
+        self.title_elements = [deepcopy(element) for element in title_elements]
+        # char -> (signature, shape elements)
+        self.rects: Dict[str, Tuple[Hashable, List[Any]]] = {}
+        # rId in the prepared shapes -> image part
+        self.image_parts: Dict[str, Any] = {}
+
+        for char, elements in rect_elements.items():
+            signature = _rect_signature(slide.rects[char])
+            if signature is None:
+                continue
+
+            image_parts = _related_image_parts(pptx_slide, elements)
+            if image_parts is None:
+                continue
+            self.rects[char] = (signature, [deepcopy(e) for e in elements])
+            self.image_parts.update(image_parts)
+
+    def can_stamp(self, slide: Slide) -> bool:
+        return bool(slide.title) == self.has_title
+
+    def stamp(self, presentation: Any, pptx_slide: Any, slide: Slide) -> None:
+        """
+        Build the shapes of `slide` by cloning the prepared shapes. Rects that
+        differ from the prepared instance are compiled by `presentation`.
+        """
+        next_shape_id = pptx_slide.shapes._spTree.max_shape_id + 1
+
+        def append_clones(elements: List[Any]) -> List[Any]:
+            nonlocal next_shape_id
+            clones, next_shape_id = clone_shapes(
+                pptx_slide, elements, self.image_parts, next_shape_id
+            )
+            return clones
+
+        if slide.title:
+            title_box = append_clones(self.title_elements)[0]
+            title_box.text_frame.paragraphs[0].text = slide.title
+
+        for char, rect in slide.rects.items():
+            prepared = self.rects.get(char)
+            if prepared is None or prepared[0] != _rect_signature(rect):
+                presentation.compile_rect(pptx_slide, rect)
+                # Shapes added by python-pptx take the next free ids
+                next_shape_id = pptx_slide.shapes._spTree.max_shape_id + 1
+                continue
+
+            if rect.content["type"] is None:
+                continue
+            with phase(rect.content["type"]):
+                clones = append_clones(prepared[1])
+                if rect.content["type"] == "text":
+                    _replace_text(clones[0].text_frame, rect.content["text"])
+                elif rect.content["type"] == "table":
+                    # Rows are built at once, with the heights of the prepared
+                    # rows
+                    tbl = clones[0].table._tbl
+                    height = sum(int(tr.get("h")) for tr in tbl.tr_lst)
+                    rows = iter_table_rows(rect.content["table_data"])
+                    fill_table(tbl, rows, height)
+
+
+def _replace_text(text_frame: Any, text: str) -> None:
+    """
+    Replace the text of a text frame, keeping the formatting of its first
+    paragraph.
+    """
+    paragraph_properties = text_frame.paragraphs[0]._p.pPr
+    text_frame.text = text
+    if paragraph_properties is not None:
+        text_frame.paragraphs[0]._p.insert(0, paragraph_properties)
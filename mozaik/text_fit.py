@@ -0,0 +1,277 @@
+"""
+Fitting of text in rects, measured with the metrics of the glyphs of a font.
+
+The advance width of each character is read once per font (with the FreeType
+support of Pillow) and cached, so that measuring a word only sums cached
+widths, and words are measured once. Text is wrapped like in PowerPoint
+textboxes, between words, and words wider than the box are broken between
+characters. The largest font size at which text fits a box is found by
+bisection, with the words of the text measured once for all the sizes tried.
+Fitting results are memoized by text and box, since decks repeat the same
+text across rects and slides.
+
+Only Pillow is imported, so that text can be fitted without python-pptx.
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Files of the fonts measuring text when no font is given, looked up in the
+# font directories of the system. Carlito has the metrics of Calibri, the
+# font of the default template of python-pptx.
+_FONT_FILES = (
+    "Carlito-Regular.ttf",
+    "calibri.ttf",
+    "LiberationSans-Regular.ttf",
+    "DejaVuSans.ttf",
+)
+
+# Size at which the glyphs are measured, in font units per em
+_UNITS_PER_EM = 1000
+
+# Insets of the text in textboxes, in inches
+TEXT_INSET_X = 0.1
+TEXT_INSET_Y = 0.05
+
+# Font sizes tried when fitting text, in inches (half points)
+_SIZE_STEP = 1 / 144
+
+# Number of fitted texts memoized by a fitter
+_MAX_MEMOIZED = 65536
+
+_WORD = re.compile(r"\S+")
+
+# Paragraphs of a text, as their start, their words as (start, end, width in
+# ems), and their width in ems on a single line
+Tokens = Tuple[Tuple[int, Tuple[Tuple[int, int, float], ...], float], ...]
+
+
+class FontMetrics:
+    """
+    Advance widths of the characters of a font, and height of its lines, in
+    ems.
+    """
+
+    def __init__(self, font_path: Optional[str] = None):
+        from PIL import ImageFont
+
+        if font_path is not None:
+            font = ImageFont.truetype(font_path, _UNITS_PER_EM)
+        else:
+            font = _load_default_font()
+        self._font = font
+        ascent, descent = font.getmetrics()
+        # Single line spacing of PowerPoint is the height of the font
+        self.line_height = (ascent + descent) / _UNITS_PER_EM
+        self._char_widths: Dict[str, float] = {}
+        self.space_width = self.char_width(" ")
+        # Words are measured once, as texts repeat the same words
+        self.word_width = lru_cache(maxsize=65536)(self._word_width)
+
+    def char_width(self, char: str) -> float:
+        width = self._char_widths.get(char)
+        if width is None:
+            width = self._font.getlength(char) / _UNITS_PER_EM
+            self._char_widths[char] = width
+        return width
+
+    def _word_width(self, word: str) -> float:
+        # Kerning is ignored, which slightly overestimates the width
+        return sum(map(self.char_width, word))
+
+
+def _load_default_font() -> Any:
+    from PIL import ImageFont
+
+    for font_file in _FONT_FILES:
+        try:
+            return ImageFont.truetype(font_file, _UNITS_PER_EM)
+        except OSError:
+            continue
+    return ImageFont.load_default(_UNITS_PER_EM)
+
+
+@lru_cache(maxsize=None)
+def font_metrics(font_path: Optional[str] = None) -> FontMetrics:
+    """
+    Return the metrics of the font at `font_path`, or of the default font
+    when it is None. Metrics are loaded once per process.
+    """
+    return FontMetrics(font_path)
+
+
+class TextFitter:
+    """
+    Fits text in boxes of a given size in inches, with font sizes between
+    `min_font_size` and `font_size` (in inches).
+    """
+
+    def __init__(
+        self,
+        font_path: Optional[str] = None,
+        font_size: float = 0.25,
+        min_font_size: float = 0.11,
+    ):
+        self.metrics = font_metrics(font_path)
+        self.font_size = font_size
+        self.min_font_size = min_font_size
+        self._tokens = lru_cache(maxsize=4096)(self._tokenize)
+        # text and size of the box -> fitted font size, or split text, for
+        # the last texts fitted
+        self._font_sizes: Dict[Tuple[str, float, float], float] = {}
+        self._splits: Dict[Tuple[str, float, float], Tuple[str, Optional[str]]] = {}
+
+    def _tokenize(self, text: str) -> Tokens:
+        word_width = self.metrics.word_width
+        paragraphs = []
+        start = 0
+        for paragraph in text.split("\n"):
+            words = []
+            for match in _WORD.finditer(paragraph):
+                words.append(
+                    (start + match.start(), start + match.end(), word_width(match[0]))
+                )
+            width = sum(word[2] for word in words)
+            if words:
+                n_spaces = words[-1][1] - words[0][0] - sum(e - s for s, e, _ in words)
+                width += n_spaces * self.metrics.space_width
+            paragraphs.append((start, tuple(words), width))
+            start += len(paragraph) + 1
+        return tuple(paragraphs)
+
+    def wrap(self, text: str, width: float, font_size: float) -> List[Tuple[int, int]]:
+        """
+        Wrap text in a textbox of `width` inches at `font_size` (in inches),
+        and return the start and end of each line in the text.
+        """
+        metrics = self.metrics
+        max_width = (width - 2 * TEXT_INSET_X) / font_size
+        lines = []
+        for start, words, paragraph_width in self._tokens(text):
+            if paragraph_width <= max_width:
+                # Most paragraphs of fitted text are a single line
+                end = words[-1][1] if words else start
+                lines.append((words[0][0] if words else start, end))
+                continue
+
+            line_start = line_end = start
+            line_width = 0.0
+            for word_start, word_end, word_width in words:
+                if line_end > line_start:
+                    gap = (word_start - line_end) * metrics.space_width
+                    if line_width + gap + word_width <= max_width:
+                        line_width += gap + word_width
+                        line_end = word_end
+                        continue
+                    lines.append((line_start, line_end))
+
+                # Words wider than the box are broken between characters
+                while word_width > max_width and word_end - word_start > 1:
+                    char_end = word_start + 1
+                    chars_width = metrics.char_width(text[word_start])
+                    while char_end < word_end:
+                        char_width = metrics.char_width(text[char_end])
+                        if chars_width + char_width > max_width:
+                            break
+                        chars_width += char_width
+                        char_end += 1
+                    lines.append((word_start, char_end))
+                    word_start = char_end
+                    word_width = metrics.word_width(text[word_start:word_end])
+
+                line_start, line_end, line_width = word_start, word_end, word_width
+            lines.append((line_start, line_end))
+        return lines
+
+    def text_height(self, n_lines: int, font_size: float) -> float:
+        """
+        Return the height in inches of a textbox of `n_lines` lines.
+        """
+        return n_lines * font_size * self.metrics.line_height + 2 * TEXT_INSET_Y
+
+    def fits(self, text: str, width: float, height: float, font_size: float) -> bool:
+        n_lines = len(self.wrap(text, width, font_size))
+        return self.text_height(n_lines, font_size) <= height
+
+    def shrink(self, text: str, width: float, height: float) -> float:
+        """
+        Return the largest font size at which text fits a box of `width` and
+        `height` inches, or the smallest font size when it never fits.
+        """
+        key = (text, width, height)
+        font_size = self._font_sizes.get(key)
+        if font_size is not None:
+            return font_size
+
+        # Larger sizes take more lines, so the sizes fitting the box are the
+        # smaller ones
+        low = math.ceil(self.min_font_size / _SIZE_STEP - 1e-9)
+        high = math.floor(self.font_size / _SIZE_STEP + 1e-9)
+        if self.fits(text, width, height, self.font_size):
+            font_size = self.font_size
+        else:
+            # Text takes at least a line per paragraph, and at least the lines
+            # holding the width of its words, which bounds the font size
+            tokens = self._tokens(text)
+            text_width = sum(word[2] for paragraph in tokens for word in paragraph[1])
+            line_height = self.metrics.line_height
+            inner_width = max(width - 2 * TEXT_INSET_X, 0.0)
+            inner_height = max(height - 2 * TEXT_INSET_Y, 0.0)
+            max_font_size = inner_height / (len(tokens) * line_height)
+            if text_width > 0:
+                max_font_size = min(
+                    max_font_size,
+                    math.sqrt(inner_height * inner_width / (text_width * line_height)),
+                )
+            high = max(low, min(high, math.floor(max_font_size / _SIZE_STEP)))
+
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self.fits(text, width, height, middle * _SIZE_STEP):
+                    low = middle
+                else:
+                    high = middle - 1
+            font_size = max(low * _SIZE_STEP, self.min_font_size)
+        if len(self._font_sizes) >= _MAX_MEMOIZED:
+            self._font_sizes.clear()
+        self._font_sizes[key] = font_size
+        return font_size
+
+    def split(
+        self, text: str, width: float, height: float
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Split text at the largest font size into the lines fitting a box of
+        `width` and `height` inches, and the remaining text, or None when it
+        all fits. At least a line is taken, so that text always progresses.
+        """
+        key = (text, width, height)
+        split = self._splits.get(key)
+        if split is not None:
+            return split
+
+        lines = self.wrap(text, width, self.font_size)
+        line_height = self.font_size * self.metrics.line_height
+        n_lines = max(1, int((height - 2 * TEXT_INSET_Y) / line_height + 1e-9))
+        if len(lines) <= n_lines:
+            split = (text, None)
+        else:
+            # The remaining text starts at the next line, without the spaces or
+            # line break ending the last line taken
+            split = (text[: lines[n_lines - 1][1]], text[lines[n_lines][0] :])
+        if len(self._splits) >= _MAX_MEMOIZED:
+            self._splits.clear()
+        self._splits[key] = split
+        return split
+
+
+@lru_cache(maxsize=16)
+def text_fitter(
+    font_path: Optional[str], font_size: float, min_font_size: float
+) -> TextFitter:
+    """
+    Return the fitter of the given font and sizes, shared by the compilations
+    of this process so that fitted texts are memoized across presentations.
+    """
+    return TextFitter(font_path, font_size, min_font_size)
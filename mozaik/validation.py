@@ -0,0 +1,225 @@
+"""
+Preflight validation of the slides of a presentation.
+
+Every rect is checked before any expensive work, without building shapes:
+content types and modes, table shapes, objects, and pictures, whose paths
+are checked with a stat call and whose headers are read to make sure they are
+pictures. All the errors are reported at once.
+
+Only python-pptx-free modules are imported, so that slides can be validated
+without loading python-pptx.
+"""
+import os
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .objects.base_object import BaseObject
+from .picture.picture_source import SUPPORTED_SOURCES, source_path
+from .slide import Rect, Slide
+
+_CONTENT_TYPES = ("picture", "figure", "text", "markdown", "table", "object")
+_PICTURE_SIZE_MODES = ("fit", "stretch", "cover")
+_HORIZONTAL_ALIGNMENTS = ("left", "center", "right", "justify")
+_TABLE_SIZE_MODES = ("stretch", "auto")
+_TEXT_FIT_MODES = ("shrink", "paginate")
+_MARKDOWN_FIT_MODES = ("shrink",)
+
+
+class ValidationError(ValueError):
+    """
+    Raised with all the errors found in the slides of a presentation.
+    """
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} error(s) in the slides:\n" + "\n".join(errors))
+
+
+def _check_picture_header(file: Any) -> Optional[str]:
+    # Pillow only reads the header of the picture to identify it
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(file):
+            return None
+    except UnidentifiedImageError:
+        return "is not a supported picture"
+    except OSError as error:
+        # Like a file without read permission, or a truncated header
+        return f"can not be read: {error}"
+
+
+class _Validator:
+    def __init__(self):
+        # path -> error of the picture at that path, or None
+        self._path_errors: Dict[str, Optional[str]] = {}
+
+    def _check_path(self, path: str) -> Optional[str]:
+        if path not in self._path_errors:
+            if not os.path.isfile(path):
+                self._path_errors[path] = f"Picture not found: {path}"
+            else:
+                error = _check_picture_header(path)
+                self._path_errors[path] = error and f"Picture {path} {error}"
+        return self._path_errors[path]
+
+    def _check_picture(self, rect: Rect) -> List[str]:
+        errors = []
+        size_mode = rect.content["picture_size_mode"]
+        if size_mode not in _PICTURE_SIZE_MODES:
+            errors.append(
+                f"Unknown picture size mode: {size_mode}"
+                + f"\nAvailable modes: {', '.join(_PICTURE_SIZE_MODES)}"
+            )
+
+        source = rect.content["picture_source"]
+        path = source_path(source)
+        if path is not None:
+            error = self._check_path(path)
+        elif hasattr(source, "savefig") or hasattr(source, "read"):
+            # Figures are only rendered and streams only read when compiling
+            error = None
+        elif hasattr(source, "__array_interface__"):
+            shape = source.__array_interface__["shape"]
+            error = None
+            if len(shape) not in (2, 3) or len(shape) == 3 and shape[2] > 4:
+                error = f"Picture array has shape {shape}, not (h, w) or (h, w, c)"
+        else:
+            try:
+                blob = memoryview(source)
+            except TypeError:
+                error = (
+                    f"Unsupported picture source: {type(source).__name__}"
+                    + f"\nSupported sources: {SUPPORTED_SOURCES}"
+                )
+            else:
+                error = _check_picture_header(BytesIO(blob))
+                error = error and f"Picture bytes {error}"
+        if error is not None:
+            errors.append(error)
+        return errors
+
+    def _check_table(self, rect: Rect) -> List[str]:
+        errors = []
+        size_mode = rect.content["table_size_mode"]
+        if size_mode not in _TABLE_SIZE_MODES:
+            errors.append(
+                f"Unknown table size mode: {size_mode}"
+                + f"\nAvailable modes: {', '.join(_TABLE_SIZE_MODES)}"
+            )
+
+        table_data = rect.content["table_data"]
+        if hasattr(table_data, "columns") and hasattr(table_data, "itertuples"):
+            return errors
+        ndim = getattr(table_data, "ndim", None)
+        if ndim is not None:
+            if ndim != 2:
+                errors.append(f"Table array must be 2D, not {ndim}D")
+            elif not len(table_data):
+                errors.append("Table data has no rows")
+            return errors
+        # Iterators are consumed when compiling, so only sequences are checked
+        if not isinstance(table_data, Sequence):
+            if not hasattr(table_data, "__iter__"):
+                errors.append(
+                    f"Table data is not iterable: {type(table_data).__name__}"
+                )
+            return errors
+
+        if not table_data:
+            errors.append("Table data has no rows")
+            return errors
+        n_cols = len(table_data[0]) if hasattr(table_data[0], "__len__") else 0
+        for row_idx, row in enumerate(table_data):
+            if not hasattr(row, "__len__"):
+                errors.append(f"Row {row_idx} of the table is not a sequence of cells")
+                break
+            # Short rows are padded, long rows do not fit the table
+            if len(row) > n_cols:
+                errors.append(
+                    f"Row {row_idx} of the table has {len(row)} cells"
+                    + f"\nThe table has {n_cols} columns"
+                )
+                break
+        return errors
+
+    def check_rect(self, rect: Rect) -> List[str]:
+        """
+        Return the errors of the content of a rect.
+        """
+        content_type = rect.content["type"]
+        if content_type is None:
+            return []
+        if content_type == "picture":
+            return self._check_picture(rect)
+        if content_type == "figure":
+            func = rect.content["figure"][0]
+            if not callable(func):
+                return [f"Figure must be a callable, not {type(func).__name__}"]
+        elif content_type == "text":
+            errors = []
+            if not isinstance(rect.content["text"], str):
+                errors.append(
+                    f"Text must be a string, not {type(rect.content['text']).__name__}"
+                )
+            alignment = rect.content["horizontal_alignment"]
+            if alignment not in _HORIZONTAL_ALIGNMENTS:
+                errors.append(
+                    f"Unknown horizontal alignment: {alignment}"
+                    + f"\nAvailable modes: {', '.join(_HORIZONTAL_ALIGNMENTS)}"
+                )
+            fit = rect.content["text_fit"]
+            if fit is not None and fit not in _TEXT_FIT_MODES:
+                errors.append(
+                    f"Unknown text fit mode: {fit}"
+                    + f"\nAvailable modes: {', '.join(_TEXT_FIT_MODES)}"
+                )
+            return errors
+        elif content_type == "markdown":
+            errors = []
+            if not isinstance(rect.content["markdown"], str):
+                errors.append(
+                    "Markdown must be a string, not "
+                    + type(rect.content["markdown"]).__name__
+                )
+            fit = rect.content["text_fit"]
+            if fit is not None and fit not in _MARKDOWN_FIT_MODES:
+                errors.append(
+                    f"Unknown Markdown fit mode: {fit}"
+                    + f"\nAvailable modes: {', '.join(_MARKDOWN_FIT_MODES)}"
+                )
+            return errors
+        elif content_type == "table":
+            return self._check_table(rect)
+        elif content_type == "object":
+            obj = rect.content["object"]
+            if not isinstance(obj, BaseObject):
+                return [f"Object must be a BaseObject, not {type(obj).__name__}"]
+        else:
+            return [
+                f"Unknown content type: {content_type}"
+                + f"\nAvailable types: {', '.join(_CONTENT_TYPES)}"
+            ]
+        return []
+
+
+def validate_slides(
+    slides: List[Slide],
+    first_number: int = 1,
+    skip: Optional[Callable[[Slide], bool]] = None,
+) -> List[str]:
+    """
+    Check the rects of `slides`, except the slides for which `skip(slide)` is
+    true, and return all the errors found, each prefixed with the number of
+    its slide (counted from `first_number`) and the char of its rect.
+    """
+    validator = _Validator()
+    errors = []
+    for slide_idx, slide in enumerate(slides, first_number - 1):
+        if skip is not None and skip(slide):
+            continue
+        for char, rect in slide.rects.items():
+            for error in validator.check_rect(rect):
+                location = f"Slide {slide_idx + 1}, rect {char!r}: "
+                errors.append(location + error.replace("\n", "\n    "))
+    return errors
@@ -0,0 +1,33 @@
+import os
+
+from mozaik import Presentation, Slide
+from mozaik.batch import generate_decks
+
+
+def build(spec: str) -> Presentation:
+    if spec == "crash":
+        # Like a worker killed for running out of memory
+        os._exit(1)
+    presentation = Presentation(10, 7.5)
+    slide = Slide("a", title=spec)
+    slide["a"].set_text(spec)
+    presentation.add_slide(slide)
+    return presentation
+
+
+def test_dead_worker_only_fails_its_decks(tmp_path):
+    specs = [(f"deck{i}", f"Deck {i}") for i in range(12)]
+    specs.insert(3, ("crash", "crash"))
+
+    results = list(generate_decks(specs, build, output_dir=str(tmp_path), workers=2))
+
+    assert sorted(result.name for result in results) == sorted(
+        name for name, _ in specs
+    )
+    failed = {result.name for result in results if not result.ok}
+    assert "crash" in failed
+    # The other worker may have been running a deck when the pool broke
+    assert len(failed) <= 2
+    for result in results:
+        if result.ok:
+            assert os.path.exists(result.path)
@@ -0,0 +1,26 @@
+from io import BytesIO
+
+from mozaik import Presentation
+from mozaik.markdown import iter_markdown_slides
+from mozaik.validation import validate_slides
+
+
+def test_remote_images_become_links():
+    document = [
+        "# Results",
+        "",
+        "Revenue is up.",
+        "",
+        "![Revenue chart](https://example.com/revenue.png)",
+        "",
+        "![](https://example.com/costs.png)",
+    ]
+
+    slides = list(iter_markdown_slides(document))
+
+    assert [list(slide.rects) for slide in slides] == [["t"]]
+    markdown = slides[0]["t"].content["markdown"]
+    assert "[Revenue chart](https://example.com/revenue.png)" in markdown
+    assert "[https://example.com/costs.png](https://example.com/costs.png)" in markdown
+    assert validate_slides(slides) == []
+    Presentation(13.33, 7.5).save_slides(BytesIO(), slides)
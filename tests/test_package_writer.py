@@ -0,0 +1,109 @@
+import zipfile
+
+import pptx
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+
+from mozaik import Presentation, Slide
+
+P14 = "http://schemas.microsoft.com/office/powerpoint/2010/main"
+
+
+def _base_deck(path):
+    """
+    Save a deck of 4 slides in the sections "First" (slides 0 and 1) and
+    "Second" (slides 2 and 3), with a custom show of slides 1 and 3.
+    """
+    prs = pptx.Presentation()
+    for i in range(4):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = f"Base {i}"
+    presentation = prs.part._element
+    sldIds = list(presentation.sldIdLst)
+
+    shows = parse_xml(
+        f"<p:custShowLst {nsdecls('p', 'r')}>"
+        '<p:custShow name="Short" id="0"><p:sldLst>'
+        f'<p:sld r:id="{sldIds[1].rId}"/><p:sld r:id="{sldIds[3].rId}"/>'
+        "</p:sldLst></p:custShow></p:custShowLst>"
+    )
+    presentation.find(qn("p:defaultTextStyle")).addprevious(shows)
+
+    sections = "".join(
+        f'<p14:section name="{name}" id="{{0000000{i}-0000-0000-0000-000000000000}}">'
+        "<p14:sldIdLst>"
+        + "".join(f'<p14:sldId id="{sldId.id}"/>' for sldId in slide_ids)
+        + "</p14:sldIdLst></p14:section>"
+        for i, (name, slide_ids) in enumerate(
+            [("First", sldIds[:2]), ("Second", sldIds[2:])]
+        )
+    )
+    ext_lst = parse_xml(
+        f"<p:extLst {nsdecls('p')}>"
+        '<p:ext uri="{521415D9-36F7-43E2-AB2F-B90AF26B5E84}">'
+        f'<p14:sectionLst xmlns:p14="{P14}">{sections}</p14:sectionLst>'
+        "</p:ext></p:extLst>"
+    )
+    presentation.append(ext_lst)
+    prs.save(path)
+
+
+def _title(slide):
+    # Titles of mozaik slides are their first text box
+    return next(shape.text_frame.text for shape in slide.shapes if shape.has_text_frame)
+
+
+def _slide_lists(path):
+    """
+    Return the titles of the slides, of the slides of each section, and of
+    the slides of the custom show of a deck.
+    """
+    prs = pptx.Presentation(path)
+    presentation = prs.part._element
+    titles = {}
+    for sldId, slide in zip(presentation.sldIdLst, prs.slides):
+        titles[sldId.id] = titles[sldId.rId] = _title(slide)
+    sections = {
+        section.get("name"): [
+            titles[int(entry.get("id"))] for entry in section.iter(f"{{{P14}}}sldId")
+        ]
+        for section in presentation.iter(f"{{{P14}}}section")
+    }
+    show = [titles[sld.get(qn("r:id"))] for sld in presentation.iter(qn("p:sld"))]
+    return [_title(slide) for slide in prs.slides], sections, show
+
+
+def _presentation():
+    presentation = Presentation(10, 7.5)
+    for i in range(2):
+        slide = Slide("a", title=f"New {i}")
+        slide["a"].set_text("text")
+        presentation.add_slide(slide)
+    return presentation
+
+
+def test_replaced_slides_take_their_place_in_sections(tmp_path):
+    _base_deck(tmp_path / "base.pptx")
+
+    _presentation().save_into(tmp_path / "base.pptx", tmp_path / "new.pptx", [1, 2])
+
+    slides, sections, show = _slide_lists(tmp_path / "new.pptx")
+    assert slides == ["Base 0", "New 0", "New 1", "Base 3"]
+    assert sections == {"First": ["Base 0", "New 0", "New 1"], "Second": ["Base 3"]}
+    assert show == ["New 0", "New 1", "Base 3"]
+    with zipfile.ZipFile(tmp_path / "new.pptx") as archive:
+        assert archive.testzip() is None
+
+
+def test_added_slides_join_the_last_section(tmp_path):
+    _base_deck(tmp_path / "base.pptx")
+
+    _presentation().save_into(tmp_path / "base.pptx", tmp_path / "new.pptx")
+
+    slides, sections, show = _slide_lists(tmp_path / "new.pptx")
+    assert slides == ["Base 0", "Base 1", "Base 2", "Base 3", "New 0", "New 1"]
+    assert sections == {
+        "First": ["Base 0", "Base 1"],
+        "Second": ["Base 2", "Base 3", "New 0", "New 1"],
+    }
+    assert show == ["Base 1", "Base 3"]
@@ -0,0 +1,22 @@
+from io import BytesIO
+
+from PIL import Image
+
+from mozaik.picture.picture_cache import PictureCache
+
+
+def test_bytes_saved_by_variants_of_one_source():
+    output = BytesIO()
+    Image.effect_noise((800, 600), 64).convert("RGB").save(output, format="PNG")
+    cache = PictureCache(target_dpi=100)
+    # Two crops of the same source, each embedded
+    wide = cache.register(output.getvalue(), 4.0, 1.0, "cover")
+    tall = cache.register(output.getvalue(), 1.0, 4.0, "cover")
+    cache.prepare()
+
+    assert wide != tall
+    assert cache.bytes_original == 2 * len(output.getvalue())
+    assert cache.bytes_embedded == len(cache.get(wide).getvalue()) + len(
+        cache.get(tall).getvalue()
+    )
+    assert 0 < cache.bytes_saved < cache.bytes_original
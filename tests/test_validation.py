@@ -0,0 +1,20 @@
+from PIL import Image
+
+from mozaik import Slide
+from mozaik.validation import validate_slides
+
+
+def test_unreadable_picture_is_reported(tmp_path, monkeypatch):
+    path = tmp_path / "picture.png"
+    Image.new("RGB", (4, 4)).save(path)
+    slide = Slide("a")
+    slide["a"].set_picture(str(path))
+
+    def open_denied(file, *args, **kwargs):
+        raise PermissionError(13, "Permission denied", str(file))
+
+    monkeypatch.setattr(Image, "open", open_denied)
+
+    (error,) = validate_slides([slide])
+    assert error.startswith(f"Slide 1, rect 'a': Picture {path} can not be read: ")
+    assert "Permission denied" in error